@@ -7,6 +7,7 @@ import json
 import os
 import uvicorn
 from pathlib import Path
+from typing import Optional
 
 # Import our app modules
 from app.routers import agents, game, websocket
@@ -59,12 +60,10 @@ async def get_characters():
         return JSONResponse(content={"characters": []})
 
 @app.get("/state")
-async def get_state():
-    """Legacy endpoint - redirects to new game state"""
+async def get_state(request: Request, wait_for_turn: Optional[int] = None):
+    """Legacy endpoint - same as /api/game/state"""
     from app.dependencies import get_game_service
-    game_service = get_game_service()
-    state = await game_service.get_game_state()
-    return JSONResponse(content=state.model_dump())
+    return await game.state_response(request, get_game_service(), wait_for_turn)
 
 @app.get("/api/overlays")
 async def get_overlays():
@@ -100,10 +99,23 @@ async def startup_event():
     print(f"🚀 Agora Simulator starting on http://{settings.API_HOST}:{settings.API_PORT}")
     print(f"📁 Agents directory: {settings.AGENTS_DIR}")
     print(f"🤖 Mistral API configured: {'Yes' if settings.MISTRAL_API_KEY else 'No'}")
+    # Load the world (snapshot or agents directory) before the first request; the
+    # game service itself needs MISTRAL_API_KEY, so it is built on first use
+    from app.dependencies import get_storage_service
+    get_storage_service()
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
+    from app.dependencies import get_storage_service, get_game_service, get_mistral_service
+    # Only shut down services that were actually built
+    if get_game_service.cache_info().currsize:
+        await get_game_service().stop_turn_loop()
+        await get_game_service().save_snapshot()
+    # Let any write-behind flush finish before the process exits
+    await get_storage_service().flush()
+    if get_mistral_service.cache_info().currsize:
+        await get_mistral_service().close()
     print("👋 Agora Simulator shutting down")
 
 if __name__ == "__main__":
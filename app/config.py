@@ -14,15 +14,66 @@ class Settings:
     MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "")
     MISTRAL_MODEL = "mistral-medium-latest"
     MISTRAL_TEMPERATURE = 0.7
+    MISTRAL_MAX_CONNECTIONS = 50  # pooled HTTP connections shared by all agents
+    MISTRAL_TIMEOUT = 30.0  # seconds per request
+
+    LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"  # JSON-schema constrained actions
+    LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"  # stream speech to spectators as it arrives
+    SPEECH_FRAME_INTERVAL = 0.1  # min seconds between partial speech frames per agent
+    LLM_USE_REMOTE_AGENTS = os.getenv("LLM_USE_REMOTE_AGENTS", "true").lower() == "true"  # send only per-turn deltas
+
+    # LLM Response Cache Settings
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"  # reuse answers to identical prompts
+    LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "300"))  # seconds an answer stays reusable
+    LLM_CACHE_SIZE = 1024  # entries (LRU)
+    LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.5"))  # hotter agents are never cached
+
+    # LLM Scheduler Settings
+    LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))  # concurrent provider requests
+    LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "5"))  # requests per second (token bucket refill)
+    LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "10"))  # token bucket capacity
+    LLM_MAX_RETRIES = 3  # retries on 429 / 5xx / transport errors
+    LLM_BACKOFF_BASE = 0.5  # seconds, doubled per retry (full jitter)
+    LLM_BACKOFF_MAX = 8.0
+    LLM_BATCH_DECISIONS = os.getenv("LLM_BATCH_DECISIONS", "false").lower() == "true"  # one request per model group
+    LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "8"))  # max agents decided by one request
+    LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))  # seconds before a duplicate request is sent (0 = off)
 
     # Game Settings
-    GAME_TURN_INTERVAL = 10  # seconds between turns
+    GAME_TURN_INTERVAL = 10  # seconds between turn starts (fixed cadence)
+    TURN_LOOP_CONFLICT = os.getenv("TURN_LOOP_CONFLICT", "skip")  # loop slot hits a running turn: "skip" or "queue"
+    TURN_PIPELINING = os.getenv("TURN_PIPELINING", "true").lower() == "true"  # request turn N+1 while N is broadcast
+    TURN_DEADLINE = float(os.getenv("TURN_DEADLINE", "8"))  # seconds agents get to decide (0 = wait for all)
+    TURN_STRAGGLER_POLICY = os.getenv("TURN_STRAGGLER_POLICY", "nothing")  # "nothing" or "carry_over"
+    SIMULATION_MODE = os.getenv("SIMULATION_MODE", "lockstep")  # "lockstep" turns or "async" per-agent clocks
+    AGENT_TICK_INTERVAL = float(os.getenv("AGENT_TICK_INTERVAL", "10"))  # async mode: seconds between an agent's actions
+    AGENT_TICK_JITTER = 0.3  # async mode: +/- fraction of the tick interval
+    EVENT_WINDOW_SECONDS = float(os.getenv("EVENT_WINDOW_SECONDS", "30"))  # async mode: events agents still see
     MAX_AGENTS = 20
     MAX_ACTION_HISTORY = 50  # per agent
 
+    # WebSocket Settings
+    WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "16"))  # frames queued per viewer before coalescing
+    WS_LAG_BUDGET = float(os.getenv("WS_LAG_BUDGET", "10"))  # seconds a viewer may stay behind before it is dropped
+    WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))  # seconds between pings to all viewers
+    WS_HISTORY_SIZE = int(os.getenv("WS_HISTORY_SIZE", "16"))  # recent state versions kept for ?since= replay
+    STATE_LONG_POLL_TIMEOUT = float(os.getenv("STATE_LONG_POLL_TIMEOUT", "30"))  # max seconds ?wait_for_turn= waits
+
+    # Storage Settings
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "file")  # "file" or "sqlite"
+    STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "yaml")  # file backend format: "yaml", "json" or "msgpack"
+    STORAGE_WRITE_BEHIND = os.getenv("STORAGE_WRITE_BEHIND", "false").lower() == "true"  # flush turn writes in the background
+    ACTION_LOG_COMPACT_THRESHOLD = 100  # stored actions per agent before compaction
+    SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "true").lower() == "true"  # warm restart from world snapshots
+    SNAPSHOT_INTERVAL_TURNS = int(os.getenv("SNAPSHOT_INTERVAL_TURNS", "1"))
+    STORAGE_LOCK_STRIPES = 64  # agent locks are striped across this many asyncio locks
+    STORAGE_UPDATE_RETRIES = 5  # optimistic update attempts before giving up on a version conflict
+
     # Paths
     BASE_DIR = Path(__file__).parent.parent
     AGENTS_DIR = BASE_DIR / "agents"
+    SQLITE_PATH = Path(os.getenv("SQLITE_PATH", str(AGENTS_DIR / "agora.db")))
+    SNAPSHOT_PATH = AGENTS_DIR / "world-snapshot"  # extension added per format
     STATIC_DIR = BASE_DIR / "static"
     TEMPLATES_DIR = BASE_DIR / "templates"
 
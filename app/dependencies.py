@@ -1,13 +1,23 @@
 from functools import lru_cache
 from app.services.storage_service import StorageService
+from app.services.storage_backends import create_backend
 from app.services.mistral_service import MistralService
 from app.services.agent_service import AgentService
 from app.services.game_service import GameService
+from app.services.snapshot_service import SnapshotService
 from app.config import settings
 
 @lru_cache()
 def get_storage_service() -> StorageService:
-    return StorageService(settings.AGENTS_DIR)
+    backend = create_backend(
+        settings.STORAGE_BACKEND, settings.AGENTS_DIR, settings.SQLITE_PATH, settings.STORAGE_FORMAT
+    )
+    records = get_snapshot_service().restore_records(backend) if settings.SNAPSHOT_ENABLED else None
+    return StorageService(settings.AGENTS_DIR, backend=backend, records=records)
+
+@lru_cache()
+def get_snapshot_service() -> SnapshotService:
+    return SnapshotService(settings.SNAPSHOT_PATH)
 
 @lru_cache()
 def get_mistral_service() -> MistralService:
@@ -22,4 +32,11 @@ def get_agent_service() -> AgentService:
 
 @lru_cache()
 def get_game_service() -> GameService:
-    return GameService(agent_service=get_agent_service())
\ No newline at end of file
+    if not settings.SNAPSHOT_ENABLED:
+        return GameService(agent_service=get_agent_service())
+
+    game_service = GameService(agent_service=get_agent_service(), snapshot_service=get_snapshot_service())
+    snapshot = get_snapshot_service().latest()
+    if snapshot:
+        game_service.restore_state(snapshot['game'])
+    return game_service
\ No newline at end of file
@@ -16,6 +16,7 @@ class Action(BaseModel):
     target: Optional[str] = None
     content: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.now)
+    turn: Optional[int] = None  # Turn the action was recorded in
 
 class GameAction(BaseModel):
     """Action format for game state"""
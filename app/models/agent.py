@@ -16,6 +16,9 @@ class Agent(BaseModel):
     action_history: List[Action] = []
     pending_deletion: bool = False  # Mark agent for deletion after leave action
     pending_entry: bool = True  # Mark agent to enter on next turn
+    version: int = 0  # Bumped by storage on every change, used to detect lost updates
+    remote_prompt_version: int = 0  # Version of the action rules installed on the remote Mistral agent
+    bypass_cache: bool = False  # Always ask the LLM, even when the response cache is enabled
 
     class Config:
         json_encoders = {
@@ -27,6 +30,7 @@ class AgentCreate(BaseModel):
     instructions: str = Field(..., min_length=1, max_length=1000)
     model: Optional[str] = "mistral-medium-latest"
     temperature: Optional[float] = Field(default=0.7, ge=0.0, le=2.0)
+    bypass_cache: bool = False  # Opt this agent out of the LLM response cache
 
 class AgentResponse(BaseModel):
     id: str
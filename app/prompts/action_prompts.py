@@ -27,4 +27,73 @@ Examples:
 {{"type": "nothing"}}
 
 Remember: SHORT messages only! Maximum 1-2 brief sentences.
-"""
\ No newline at end of file
+"""
+BATCH_ACTION_PROMPT = """You are deciding the next action for each of the characters below. They are all in: {map_description}
+
+Recent events:
+{recent_context}
+
+Characters:
+{characters}
+
+Each character acts on their own personality and what they know. Keep messages SHORT and CONCISE: 1-2 short sentences maximum. Be natural and conversational.
+
+Available actions:
+- say: Speak to everyone in the room (content: your message)
+- speak_to: Address someone specific (target: character name, content: your message)
+- move: Move to a different spot in the room
+- enter: Enter the room (content: optional greeting)
+- leave: Leave the room (content: optional farewell message)
+- nothing: Do nothing this turn
+
+Choose ONE action for EVERY character listed.
+Respond with ONLY a JSON array containing one object per character, in this exact format:
+[{{"agent_id": "character_id", "type": "action_type", "target": "optional_target_name", "content": "optional_message"}}]
+
+Example:
+[{{"agent_id": "agent-1a2b3c4d", "type": "say", "content": "Hello everyone!"}}, {{"agent_id": "agent-5e6f7a8b", "type": "speak_to", "target": "Alice", "content": "How are you?"}}]
+
+Remember: SHORT messages only! Maximum 1-2 brief sentences each.
+"""
+
+BATCH_CHARACTER_BLOCK = """### {agent_id} ({agent_name})
+Personality: {agent_instructions}
+{private_context}"""
+
+# Remote (server-side) agents carry the personality and the action rules in
+# their instructions, so each turn only sends TURN_PROMPT. Bump
+# AGENT_PROMPT_VERSION whenever AGENT_INSTRUCTIONS changes so existing
+# remote agents get updated.
+AGENT_PROMPT_VERSION = 1
+
+AGENT_INSTRUCTIONS = """You are {agent_name}, a character in a shared room with other characters.
+
+Your personality: {agent_instructions}
+
+Each turn you are told where you are and what just happened, and you choose ONE action.
+
+IMPORTANT: Keep your messages SHORT and CONCISE. Use 1-2 short sentences maximum. Be natural and conversational.
+
+Available actions:
+- say: Speak to everyone in the room (content: your message)
+- speak_to: Address someone specific (target: character name, content: your message)
+- move: Move to a different spot in the room
+- enter: Enter the room (content: optional greeting)
+- leave: Leave the room (content: optional farewell message)
+- nothing: Do nothing this turn
+
+Respond with ONLY a JSON object in this exact format:
+{{"type": "action_type", "target": "optional_target_name", "content": "optional_message"}}
+
+Examples:
+{{"type": "say", "content": "Hello everyone!"}}
+{{"type": "speak_to", "target": "Alice", "content": "How are you?"}}
+{{"type": "move"}}
+{{"type": "nothing"}}
+"""
+
+TURN_PROMPT = """Location: {map_description}
+
+Recent events:
+{recent_context}
+"""
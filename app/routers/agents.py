@@ -2,7 +2,9 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List
 from app.models.agent import Agent, AgentCreate, AgentResponse
 from app.services.agent_service import AgentService
-from app.dependencies import get_agent_service
+from app.services.game_service import GameService
+from app.dependencies import get_agent_service, get_game_service
+from app.routers.websocket import notify_state_change
 
 router = APIRouter()
 
@@ -78,10 +80,12 @@ async def get_agent(
 
 @router.delete("/all")
 async def clear_all_agents(
-    agent_service: AgentService = Depends(get_agent_service)
+    agent_service: AgentService = Depends(get_agent_service),
+    game_service: GameService = Depends(get_game_service)
 ):
     """Delete all agents"""
     deleted_count = await agent_service.clear_all_agents()
+    await notify_state_change(game_service)
     return {"message": f"Deleted {deleted_count} agents", "count": deleted_count}
 
 @router.delete("/{agent_id}")
@@ -1,16 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from app.models.game import GameState, TurnContext, MapInfo
 from app.services.game_service import GameService
 from app.dependencies import get_game_service
+from app.routers.websocket import notify_state_change
+from app.config import settings
 
 router = APIRouter()
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def state_response(request: Request, game_service: GameService, wait_for_turn: Optional[int] = None) -> Response:
+    """Current state as a conditional response.
+
+    With `wait_for_turn` the request is held until that turn has completed
+    (at most STATE_LONG_POLL_TIMEOUT seconds); an unchanged state is answered
+    with 304 without being rebuilt.
+    """
+    if wait_for_turn is not None:
+        await game_service.wait_for_turn(wait_for_turn, settings.STATE_LONG_POLL_TIMEOUT)
+
+    headers = {"Cache-Control": "no-cache"}
+    etag = game_service.state_etag()
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    snapshot = await game_service.get_state_snapshot()
+    return Response(content=snapshot.body, media_type="application/json", headers={**headers, "ETag": snapshot.etag})
+
 @router.get("/state", response_model=GameState)
 async def get_game_state(
+    request: Request,
+    wait_for_turn: Optional[int] = None,
     game_service: GameService = Depends(get_game_service)
 ):
-    """Get current game state"""
-    return await game_service.get_game_state()
+    """Get current game state (supports If-None-Match and ?wait_for_turn=N long-polling)"""
+    return await state_response(request, game_service, wait_for_turn)
 
 @router.post("/turn", response_model=TurnContext)
 async def execute_turn(
@@ -18,6 +48,9 @@ async def execute_turn(
 ):
     """Execute one game turn"""
     print("[API] Manual turn execution requested")
+    if settings.SIMULATION_MODE == "async":
+        # Agents act on their own clocks; a lockstep turn would race with their events
+        raise HTTPException(status_code=409, detail="Manual turns are not available with SIMULATION_MODE=async")
     result = await game_service.execute_turn()
     print(f"[API] Turn execution completed")
     return result
@@ -29,7 +62,9 @@ async def start_game(
     """Start automatic turn execution"""
     print("[API] Starting automatic turn execution")
     await game_service.start_turn_loop()
-    return {"message": "Game started", "turn_interval": 10}
+    if settings.SIMULATION_MODE == "async":
+        return {"message": "Game started", "mode": "async", "tick_interval": settings.AGENT_TICK_INTERVAL}
+    return {"message": "Game started", "turn_interval": settings.GAME_TURN_INTERVAL}
 
 @router.post("/stop")
 async def stop_game(
@@ -39,6 +74,13 @@ async def stop_game(
     await game_service.stop_turn_loop()
     return {"message": "Game stopped"}
 
+@router.get("/metrics")
+async def get_metrics(
+    game_service: GameService = Depends(get_game_service)
+):
+    """Get runtime metrics (LLM scheduler, turn loop, websocket fan-out)"""
+    return game_service.get_metrics()
+
 @router.get("/map")
 async def get_map(
     game_service: GameService = Depends(get_game_service)
@@ -56,4 +98,5 @@ async def change_map(
 ):
     """Change the current map"""
     game_service.change_map(map_info.id, map_info.description)
+    await notify_state_change(game_service)
     return {"message": "Map changed successfully", "map": map_info.model_dump()}
\ No newline at end of file
@@ -1,42 +1,301 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from typing import Set
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import time
 import asyncio
-import json
-from app.services.game_service import GameService
+from app.config import settings
+from app.services.codecs import JsonCodec, available_codecs
+from app.services.game_service import GameService, MaterializedState
+from app.services.state_delta import diff_states
 from app.dependencies import get_game_service
 
 router = APIRouter()
 
+# Optional binary subprotocol, offered only when msgpack is installed
+MSGPACK_SUBPROTOCOL = "msgpack"
+_json = JsonCodec()
+_msgpack = available_codecs().get("msgpack")
+
+
+class Frame:
+    """One outgoing message, encoded at most once per wire format and shared by every client"""
+
+    __slots__ = ('message', 'state', '_text', '_packed')
+
+    def __init__(self, message: Dict[str, Any], text: Optional[str] = None, state: bool = False):
+        self.message = message
+        self.state = state  # carries game state, so a newer state frame supersedes it
+        self._text = text
+        self._packed: Optional[bytes] = None
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = _json.dumps(self.message).decode()
+        return self._text
+
+    def packed(self) -> bytes:
+        if self._packed is None:
+            self._packed = _msgpack.dumps(self.message)
+        return self._packed
+
+
+class ClientConnection:
+    """One viewer: an outbound frame queue, drained by a writer task only while it has frames"""
+
+    __slots__ = ('websocket', 'delta', 'binary', 'queue', 'behind_since', 'sending_since', 'writer', '_manager')
+
+    def __init__(self, websocket: WebSocket, delta: bool, binary: bool, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.delta = delta
+        self.binary = binary
+        self.queue: Deque[Frame] = deque()
+        self.behind_since: Optional[float] = None  # first overflow since the queue last drained
+        self.sending_since: Optional[float] = None  # start of the send in progress
+        self.writer: Optional[asyncio.Task] = None
+        self._manager = manager
+
+    def push(self, frame: Frame):
+        self.queue.append(frame)
+        if self.writer is None:
+            self.writer = asyncio.create_task(self._write())
+
+    async def _write(self):
+        manager = self._manager
+        try:
+            while self.queue:
+                frame = self.queue.popleft()
+                self.sending_since = time.monotonic()
+                if self.binary:
+                    await self.websocket.send_bytes(frame.packed())
+                else:
+                    await self.websocket.send_text(frame.text())
+                self.sending_since = None
+                manager.stats['frames_sent'] += 1
+            self.behind_since = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WebSocket] Failed to send to client: {e}")
+            manager.stats['send_failures'] += 1
+            manager.disconnect(self.websocket)
+        finally:
+            self.writer = None
+
+
 # Store active WebSocket connections
 class ConnectionManager:
+    """Fans state out to viewers, each through its own frame queue"""
+
     def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
+        self.clients: Dict[WebSocket, ClientConnection] = {}
         self.broadcast_task = None
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.add(websocket)
+        # Last broadcast state, the base of the next delta
+        self.version = 0
+        # Versions restart with the process; the epoch tells a resuming client's version apart
+        self.epoch = f"{int(time.time() * 1000):x}"
+        self._state: Optional[Dict[str, Any]] = None
+        self._state_key: Optional[tuple] = None
+        self._state_frame: Optional[Frame] = None
+        self._snapshot_frame: Optional[Frame] = None
+        # Recent versions as (version, snapshot frame), replayed to reconnecting delta clients
+        self.history: Deque[Tuple[int, Frame]] = deque(maxlen=settings.WS_HISTORY_SIZE)
+        self._heartbeat: Optional[asyncio.Task] = None
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.discard(websocket)
+        self.stats = {
+            'frames_queued': 0, 'frames_sent': 0, 'frames_coalesced': 0, 'frames_dropped': 0,
+            'lag_disconnects': 0, 'send_failures': 0, 'heartbeats': 0,
+            'replays': 0, 'replayed_frames': 0, 'replay_fallbacks': 0
+        }
 
-    async def broadcast_state(self, state: dict):
-        """Broadcast state to all connected clients"""
-        if self.active_connections:
-            print(f"[WebSocket] Broadcasting state to {len(self.active_connections)} clients (Turn: {state.get('turn', 'unknown')})")
+    @staticmethod
+    def select_subprotocol(websocket: WebSocket) -> Optional[str]:
+        """The binary subprotocol if the client offers it and msgpack is available"""
+        if _msgpack is not None and MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", []):
+            return MSGPACK_SUBPROTOCOL
+        return None
 
-        disconnected = set()
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(state)
-            except Exception as e:
-                print(f"[WebSocket] Failed to send to client: {e}")
-                disconnected.add(connection)
+    async def connect(self, websocket: WebSocket, snapshot: MaterializedState, delta: bool = False,
+                      since: Optional[int] = None, epoch: Optional[str] = None):
+        """Accept a client and queue its initial state ahead of any broadcast.
+
+        A delta client resuming after version `since` of this process's
+        `epoch` first gets the versions it missed from the history, when they
+        are all still there.
+        """
+        subprotocol = self.select_subprotocol(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        client = ClientConnection(websocket, delta, subprotocol is not None, self)
+        if self._state_frame is None:
+            # Nothing broadcast yet: start this client from `snapshot` as version 0. The
+            # shared version only moves on broadcasts, so a state caught mid-turn never
+            # reaches other clients or the history.
+            if delta:
+                frame = self._make_snapshot_frame(0, snapshot)
+            else:
+                frame = Frame(snapshot.data, text=snapshot.text, state=True)
+            client.push(frame)
+        else:
+            for frame in self._initial_frames(delta, since, epoch):
+                client.push(frame)
+        self.clients[websocket] = client
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
 
-        # Remove disconnected clients
-        for conn in disconnected:
-            self.active_connections.discard(conn)
-            print(f"[WebSocket] Removed disconnected client (remaining: {len(self.active_connections)})")
+    def _initial_frames(self, delta: bool, since: Optional[int], epoch: Optional[str]) -> List[Frame]:
+        """Missed versions after version `since` followed by the current state"""
+        if not delta:
+            return [self._state_frame]
+        current = self._snapshot_frame
+        if since is None or since == self.version:
+            return [current]
+        entries = list(self.history)
+        missed = [frame for version, frame in entries[:-1] if version > since]
+        if (epoch != self.epoch or not entries or not entries[0][0] <= since < self.version
+                or len(missed) >= settings.WS_SEND_QUEUE_SIZE):
+            # Another process's version, part of the gap is gone, or it would be
+            # coalesced anyway: start from the current state
+            print(f"[WebSocket] Cannot replay from version {since}, sending current state")
+            self.stats['replay_fallbacks'] += 1
+            return [current]
+        if missed:
+            self.stats['replays'] += 1
+            self.stats['replayed_frames'] += len(missed)
+        return missed + [current]
+
+    def disconnect(self, websocket: WebSocket, close: bool = True):
+        """Forget a client; `close` closes the socket when the client has not already done so"""
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        if client.writer is not None:
+            client.writer.cancel()
+        if close:
+            asyncio.create_task(self._close(websocket))
+
+    async def _heartbeat_loop(self):
+        """One task pinging every client each WS_HEARTBEAT_INTERVAL; ends when nobody is connected"""
+        ping = Frame({"type": "ping"})
+        try:
+            while self.clients:
+                await asyncio.sleep(settings.WS_HEARTBEAT_INTERVAL)
+                self.stats['heartbeats'] += 1
+                # Pinging also catches clients stuck in a send when no broadcast is coming
+                for client in list(self.clients.values()):
+                    self._enqueue(client, ping)
+        finally:
+            self._heartbeat = None
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass  # already closed by the client
+
+    async def broadcast_state(self, snapshot: MaterializedState):
+        """Queue the materialized state for all connected clients; a slow viewer never delays the turn"""
+        self._publish_state(snapshot)
+
+    def _publish_state(self, snapshot: MaterializedState):
+        if snapshot.key == self._state_key:
+            return
+        delta_frame = self._advance(snapshot)
+
+        if self.clients:
+            print(f"[WebSocket] Broadcasting state to {len(self.clients)} clients (Turn: {snapshot.state.turn}, version {self.version})")
+        for client in list(self.clients.values()):
+            if client.delta:
+                # Without a previous version there is nothing to diff against: send the snapshot
+                self._enqueue(client, delta_frame or self._snapshot_frame)
+            else:
+                self._enqueue(client, self._state_frame)
+
+    def _advance(self, snapshot: MaterializedState) -> Optional[Frame]:
+        """Make `snapshot` the current version; returns the delta from the previous one"""
+        delta_frame = None
+        if self._state is not None:
+            delta = diff_states(self._state, snapshot.data)
+            delta_frame = Frame({
+                'type': 'delta', 'version': self.version + 1, 'base': self.version, **delta
+            }, state=True)
+        self.version += 1
+        self._state = snapshot.data
+        self._state_key = snapshot.key
+        self._state_frame = Frame(snapshot.data, text=snapshot.text, state=True)
+        self._snapshot_frame = self._make_snapshot_frame(self.version, snapshot)
+        self.history.append((self.version, self._snapshot_frame))
+        return delta_frame
+
+    def _make_snapshot_frame(self, version: int, snapshot: MaterializedState) -> Frame:
+        # The state is already encoded as JSON: splice it in instead of encoding it again
+        return Frame(
+            {'type': 'snapshot', 'version': version, 'epoch': self.epoch, 'state': snapshot.data},
+            text=f'{{"type":"snapshot","version":{version},"epoch":"{self.epoch}","state":{snapshot.text}}}',
+            state=True
+        )
+
+    def _enqueue(self, client: ClientConnection, frame: Frame):
+        """Queue a frame, coalescing to the latest state when the client has fallen behind"""
+        if self._over_lag_budget(client):
+            return
+        if len(client.queue) >= settings.WS_SEND_QUEUE_SIZE:
+            if client.behind_since is None:
+                client.behind_since = time.monotonic()
+            if not frame.state:
+                # Speech and pings are only useful live
+                self.stats['frames_dropped'] += 1
+                return
+            # Everything queued is stale: the latest state replaces it
+            self.stats['frames_coalesced'] += len(client.queue)
+            client.queue.clear()
+            frame = self._snapshot_frame if client.delta else self._state_frame
+        self.stats['frames_queued'] += 1
+        client.push(frame)
+
+    def _over_lag_budget(self, client: ClientConnection) -> bool:
+        """Disconnect a client stuck in one send, or behind, for longer than WS_LAG_BUDGET"""
+        now = time.monotonic()
+        stuck = client.sending_since is not None and now - client.sending_since > settings.WS_LAG_BUDGET
+        behind = client.behind_since is not None and now - client.behind_since > settings.WS_LAG_BUDGET
+        if not (stuck or behind):
+            return False
+        print(f"[WebSocket] Client {'stuck in a send' if stuck else 'behind'} for more than {settings.WS_LAG_BUDGET}s, disconnecting")
+        self.stats['lag_disconnects'] += 1
+        self.disconnect(client.websocket)
+        return True
+
+    def send(self, websocket: WebSocket, message: dict):
+        """Queue a message for one client"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            self._enqueue(client, Frame(message))
+
+    def resync(self, websocket: WebSocket):
+        """Queue the current snapshot for a delta client that lost track of the version"""
+        client = self.clients.get(websocket)
+        if client is not None and self._snapshot_frame is not None:
+            self._enqueue(client, self._snapshot_frame)
+
+    async def broadcast(self, message: dict):
+        """Queue a message for all connected clients"""
+        frame = Frame(message)
+        for client in list(self.clients.values()):
+            self._enqueue(client, frame)
+
+    def metrics(self) -> Dict[str, Any]:
+        depths = [len(client.queue) for client in self.clients.values()]
+        return {
+            'clients': len(self.clients),
+            'delta_clients': sum(1 for client in self.clients.values() if client.delta),
+            'binary_clients': sum(1 for client in self.clients.values() if client.binary),
+            'behind': sum(1 for client in self.clients.values() if client.behind_since is not None),
+            'writers': sum(1 for client in self.clients.values() if client.writer is not None),
+            'version': self.version,
+            'queue_depth': sum(depths),
+            'max_queue_depth': max(depths, default=0),
+            **self.stats,
+        }
 
 manager = ConnectionManager()
 
@@ -46,35 +305,53 @@ async def websocket_endpoint(
     game_service: GameService = Depends(get_game_service)
 ):
     """WebSocket endpoint for real-time game state updates"""
-    print(f"[WebSocket] New client connecting...")
-    await manager.connect(websocket)
-    print(f"[WebSocket] Client connected (total: {len(manager.active_connections)})")
+    # ?protocol=delta: a versioned snapshot first, then one delta per state change;
+    # a client seeing a version gap sends {"type": "resync"}. Other clients get the
+    # full state every time. ?since=<version>&epoch=<epoch>, both taken from received
+    # frames, replays the versions a reconnecting delta client missed.
+    delta = websocket.query_params.get("protocol") == "delta"
+    since = websocket.query_params.get("since")
+    since = int(since) if since and since.isdigit() else None
+    epoch = websocket.query_params.get("epoch")
+    print(f"[WebSocket] New client connecting{' (delta protocol)' if delta else ''}"
+          f"{f', resuming after version {since}' if since is not None else ''}...")
 
     try:
         # Send initial state
-        state = await game_service.get_game_state()
-        print(f"[WebSocket] Sending initial state to new client (Turn: {state.turn})")
-        await websocket.send_json(state.model_dump())
+        snapshot = await game_service.get_state_snapshot()
+        print(f"[WebSocket] Sending initial state to new client (Turn: {snapshot.state.turn})")
+        await manager.connect(websocket, snapshot, delta, since, epoch)
+        print(f"[WebSocket] Client connected (total: {len(manager.clients)})")
 
-        # Keep connection alive but don't send periodic updates
-        # Updates will be sent via notify_state_change when turns complete
+        # Updates and pings are pushed by the manager; reading here notices a
+        # close as soon as it arrives and answers resync requests
         while True:
-            # Just keep the connection alive with a ping
-            await asyncio.sleep(30)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
             try:
-                await websocket.send_json({"type": "ping"})
-            except:
-                break
+                if message.get("bytes") is not None and _msgpack is not None:
+                    request = _msgpack.loads(message["bytes"])
+                else:
+                    request = _json.loads(message.get("text") or "")
+            except Exception:
+                continue
+            if delta and isinstance(request, dict) and request.get("type") == "resync":
+                print(f"[WebSocket] Client requested resync, sending version {manager.version}")
+                manager.resync(websocket)
 
     except WebSocketDisconnect:
         print(f"[WebSocket] Client disconnected")
-        manager.disconnect(websocket)
-        print(f"[WebSocket] Remaining clients: {len(manager.active_connections)}")
+        manager.disconnect(websocket, close=False)
+        print(f"[WebSocket] Remaining clients: {len(manager.clients)}")
     except Exception as e:
         print(f"[WebSocket] Error: {e}")
         manager.disconnect(websocket)
 
 async def notify_state_change(game_service: GameService):
-    """Notify all connected clients of state change"""
-    state = await game_service.get_game_state()
-    await manager.broadcast_state(state.model_dump())
\ No newline at end of file
+    """Notify all connected clients of a state change made between turns"""
+    # A turn being applied broadcasts the change itself once its state is complete
+    if game_service.applying_turn:
+        return
+    await manager.broadcast_state(await game_service.get_state_snapshot())
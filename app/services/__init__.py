@@ -1,6 +1,7 @@
-from .storage_service import StorageService
+from .storage_service import StorageService, VersionConflictError
+from .storage_backends import StorageBackend, FileBackend, SqliteBackend
 from .mistral_service import MistralService
 from .agent_service import AgentService
 from .game_service import GameService
 
-__all__ = ["StorageService", "MistralService", "AgentService", "GameService"]
\ No newline at end of file
+__all__ = ["StorageService", "VersionConflictError", "StorageBackend", "FileBackend", "SqliteBackend", "MistralService", "AgentService", "GameService"]
\ No newline at end of file
@@ -0,0 +1,160 @@
+import re
+import json
+from typing import Any, Dict, Optional, Tuple
+from app.models.action import ActionType
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ACTION_TYPES = frozenset(action.value for action in ActionType)
+
+
+def action_json_schema() -> Dict[str, Any]:
+    """JSON schema of one action, derived from ActionType"""
+    return {
+        "type": "object",
+        "properties": {
+            "type": {"type": "string", "enum": [action.value for action in ActionType]},
+            "target": {"type": ["string", "null"]},
+            "content": {"type": ["string", "null"]},
+        },
+        # Strict mode needs every property listed; optional ones are nullable
+        "required": ["type", "target", "content"],
+        "additionalProperties": False,
+    }
+
+
+def action_response_format() -> Dict[str, Any]:
+    """response_format constraining a completion to a single action"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "agent_action",
+            "schema_definition": action_json_schema(),
+            "strict": True,
+        },
+    }
+
+
+def _loads(text: str) -> Any:
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def validate_action(data: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Check a decoded action; returns (action, None) or (None, reason)"""
+    if not isinstance(data, dict):
+        return None, f"expected an object, got {type(data).__name__}"
+    action_type = data.get('type')
+    if action_type not in ACTION_TYPES:
+        return None, f"invalid action type: {action_type}"
+
+    action = {'type': action_type}
+    for field in ('target', 'content'):
+        value = data.get(field)
+        if value is not None and not isinstance(value, str):
+            if isinstance(value, (dict, list)):
+                return None, f"{field} must be a string"
+            value = str(value)
+        action[field] = value or None
+    return action, None
+
+
+def parse_action(content: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Parse a completion into an action; returns (action, None) or (None, reason).
+
+    Structured responses are plain JSON and decode directly; free text falls
+    back to extracting the outermost {...}.
+    """
+    text = content.strip()
+    try:
+        return validate_action(_loads(text))
+    except ValueError:
+        pass
+
+    start = text.find('{')
+    end = text.rfind('}') + 1
+    if start == -1 or end <= start:
+        return None, "no JSON object in response"
+    try:
+        return validate_action(_loads(text[start:end]))
+    except ValueError as e:
+        return None, f"invalid JSON: {e}"
+
+
+_TYPE_FIELD = re.compile(r'"type"\s*:\s*"([a-z_]+)"')
+_CONTENT_FIELD = re.compile(r'"content"\s*:\s*"')
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class SpeechStreamExtractor:
+    """Incrementally pulls `type` and the partial `content` string out of a streamed JSON action.
+
+    Feed completion chunks as they arrive; `content` holds the decoded text
+    received so far. The full reply is still parsed with parse_action at the end.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.type: Optional[str] = None
+        self.content = ""
+        self.complete = False
+        self._pos: Optional[int] = None  # scan position inside the content string
+
+    def feed(self, chunk: str) -> bool:
+        """Add a chunk; returns True if more content was decoded"""
+        self.buffer += chunk
+        if self.type is None:
+            match = _TYPE_FIELD.search(self.buffer)
+            if match:
+                self.type = match.group(1)
+        if self._pos is None:
+            match = _CONTENT_FIELD.search(self.buffer)
+            if not match:
+                return False
+            self._pos = match.end()
+
+        grew = False
+        buffer = self.buffer
+        while not self.complete and self._pos < len(buffer):
+            char = buffer[self._pos]
+            if char == '"':
+                self.complete = True
+            elif char != '\\':
+                self.content += char
+                self._pos += 1
+                grew = True
+            else:
+                decoded, length = self._escape(buffer, self._pos)
+                if decoded is None:
+                    break  # escape sequence split across chunks
+                self.content += decoded
+                self._pos += length
+                grew = True
+        return grew
+
+    @staticmethod
+    def _escape(buffer: str, pos: int) -> Tuple[Optional[str], int]:
+        """Decode the escape sequence at buffer[pos]; (None, 0) if it is incomplete"""
+        if pos + 1 >= len(buffer):
+            return None, 0
+        kind = buffer[pos + 1]
+        if kind != 'u':
+            return _ESCAPES.get(kind, kind), 2
+        if pos + 6 > len(buffer):
+            return None, 0
+        try:
+            code = int(buffer[pos + 2:pos + 6], 16)
+        except ValueError:
+            return "", 6
+        if 0xD800 <= code < 0xDC00:
+            # High surrogate: combine with the following \uXXXX low surrogate
+            if pos + 12 > len(buffer):
+                return None, 0
+            try:
+                low = int(buffer[pos + 8:pos + 12], 16)
+            except ValueError:
+                return "", 12
+            return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+        return chr(code), 6
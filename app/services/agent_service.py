@@ -1,5 +1,6 @@
 import uuid
 import sys
+import asyncio
 import os
 from typing import List, Optional, Dict, Any
 from datetime import datetime
@@ -8,6 +9,7 @@ from app.models.action import Action
 from app.services.storage_service import StorageService
 from app.services.mistral_service import MistralService
 from app.config import settings
+from app.prompts.action_prompts import AGENT_PROMPT_VERSION
 
 # Add parent directory to path to import gemini_generate
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -17,12 +19,13 @@ class AgentService:
     def __init__(self, storage_service: StorageService, mistral_service: MistralService):
         self.storage = storage_service
         self.mistral = mistral_service
+        self.hedge_stats = {'sent': 0, 'won': 0}
+        self._remote_syncs: Dict[str, asyncio.Task] = {}
 
     async def create_agent(self, agent_data: AgentCreate) -> Agent:
         """Create a new agent"""
         # Check if we've reached the maximum number of agents
-        existing_agents = await self.storage.list_agents()
-        if len(existing_agents) >= settings.MAX_AGENTS:
+        if await self.storage.count_agents() >= settings.MAX_AGENTS:
             raise ValueError(f"Maximum number of agents ({settings.MAX_AGENTS}) reached")
 
         # Generate unique ID
@@ -47,20 +50,18 @@ class AgentService:
             # We'll use the instructions as they contain the personality/appearance details
             character_description = f"{agent_data.name}: {agent_data.instructions}"
 
-            # Run character generation in a separate thread to avoid event loop issues
-            import concurrent.futures
-            import asyncio
-
+            # Run character generation in a worker thread and await it, so the
+            # event loop (turns, websockets) keeps running while sprites render
             def run_generation():
                 return generate_character(
                     description=character_description,
                     character_id=agent_id  # Use same ID for easy matching
                 )
 
-            # Execute in thread pool to avoid event loop conflicts
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(run_generation)
-                character_result = future.result(timeout=60)  # 60 second timeout
+            character_result = await asyncio.wait_for(
+                asyncio.to_thread(run_generation),
+                timeout=60  # 60 second timeout
+            )
 
             if character_result:
                 character_id = character_result.get('character_id', agent_id)
@@ -74,10 +75,12 @@ class AgentService:
             id=agent_id,
             name=agent_data.name,  # Keep original name locally
             mistral_id=mistral_id,
+            remote_prompt_version=AGENT_PROMPT_VERSION,  # created with the current action rules
             model=agent_data.model or settings.MISTRAL_MODEL,
             instructions=agent_data.instructions,
             character_id=character_id,  # Store the character sprite ID
             temperature=agent_data.temperature or settings.MISTRAL_TEMPERATURE,
+            bypass_cache=agent_data.bypass_cache,
             created_at=datetime.now(),
             visible=False,  # Start invisible
             pending_entry=True  # Will enter on next turn
@@ -102,15 +105,12 @@ class AgentService:
 
     async def delete_agent(self, agent_id: str) -> bool:
         """Mark an agent for deletion - will leave on next turn then be deleted"""
-        agent_data = await self.storage.load_agent(agent_id)
-        if not agent_data:
-            return False
+        def mark(agent_data: Dict[str, Any]):
+            # Mark agent as pending deletion
+            agent_data['pending_deletion'] = True
+            agent_data['visible'] = True  # Ensure visible for leave action
 
-        # Mark agent as pending deletion
-        agent_data['pending_deletion'] = True
-        agent_data['visible'] = True  # Ensure visible for leave action
-        await self.storage.save_agent(agent_id, agent_data)
-        return True
+        return await self.storage.update_agent(agent_id, mark) is not None
 
     async def permanently_delete_agent(self, agent_id: str) -> bool:
         """Permanently delete an agent (called after leave action)"""
@@ -129,33 +129,181 @@ class AgentService:
 
     async def update_agent_visibility(self, agent_id: str, visible: bool) -> bool:
         """Update agent visibility"""
-        agent_data = await self.storage.load_agent(agent_id)
-        if not agent_data:
-            return False
+        def apply(agent_data: Dict[str, Any]):
+            agent_data['visible'] = visible
+
+        return await self.storage.update_agent(agent_id, apply) is not None
+
+    async def complete_entry(self, agent_id: str) -> bool:
+        """Clear the pending_entry flag and make the agent visible"""
+        def apply(agent_data: Dict[str, Any]):
+            agent_data['pending_entry'] = False
+            agent_data['visible'] = True
 
-        agent_data['visible'] = visible
-        await self.storage.save_agent(agent_id, agent_data)
-        return True
+        return await self.storage.update_agent(agent_id, apply) is not None
 
     async def add_agent_action(self, agent_id: str, action: Action) -> bool:
         """Add an action to agent's history"""
         return await self.storage.update_agent_action(agent_id, action.model_dump())
 
-    async def generate_agent_action(self, agent_id: str, context: Dict[str, Any]) -> Optional[Action]:
-        """Generate an action for an agent"""
+    async def decide_agent_action(self, agent_id: str, context: Dict[str, Any],
+                                  on_speech=None) -> Optional[Action]:
+        """Ask the LLM for an agent's next action without recording it.
+
+        `on_speech` receives partial speech while the answer streams in.
+        """
         agent_data = await self.storage.load_agent(agent_id)
         if not agent_data:
             return None
+        if (settings.LLM_USE_REMOTE_AGENTS and agent_data.get('mistral_id')
+                and agent_data.get('remote_prompt_version') != AGENT_PROMPT_VERSION):
+            agent_data = await self._sync_remote_agent(agent_data)
+
+        make_call = lambda: self.mistral.generate_action(agent_data, context)
+        if on_speech is not None:
+            make_call = self._speaking_calls(agent_data, context, on_speech)
 
-        action_data = await self.mistral.generate_action(agent_data, context)
+        action_data = await self._hedged(make_call)
         if action_data:
-            action = Action(**action_data)
-            # Add to history
-            await self.add_agent_action(agent_id, action)
-            return action
+            return Action(**action_data)
 
         return None
 
+    async def _sync_remote_agent(self, agent_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Install the current action rules on an agent's remote Mistral agent (once)"""
+        agent_id = agent_data['id']
+        if agent_id not in self._remote_syncs:
+            async def sync():
+                if await self.mistral.update_agent_instructions(
+                    agent_data['mistral_id'], agent_data['name'], agent_data['instructions']
+                ):
+                    def apply(record: Dict[str, Any]):
+                        record['remote_prompt_version'] = AGENT_PROMPT_VERSION
+                    await self.storage.update_agent(agent_id, apply)
+                    print(f"Updated remote agent for {agent_data['name']} to prompt version {AGENT_PROMPT_VERSION}")
+
+            self._remote_syncs[agent_id] = asyncio.create_task(sync())
+        # Shield so a cancelled decision doesn't abort the update for everyone else
+        await asyncio.shield(self._remote_syncs[agent_id])
+        self._remote_syncs.pop(agent_id, None)
+        return await self.storage.load_agent(agent_id) or agent_data
+
+    async def decide_agent_actions_batched(self, agent_ids: List[str], context: Dict[str, Any]) -> Dict[str, asyncio.Future]:
+        """Start batched decisions for several agents and return one future per agent.
+
+        Agents sharing a model and temperature are decided together, up to
+        LLM_BATCH_SIZE per request. Agents the batch didn't answer for are
+        asked individually. Cancelling every future of a group cancels its request.
+        """
+        loop = asyncio.get_running_loop()
+        futures = {}
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for agent_id in agent_ids:
+            agent_data = await self.storage.load_agent(agent_id)
+            futures[agent_id] = loop.create_future()
+            if agent_data is None:
+                futures[agent_id].set_result(None)
+                continue
+            key = (agent_data.get('model'), agent_data.get('temperature'))
+            groups.setdefault(key, []).append(agent_data)
+
+        for members in groups.values():
+            for i in range(0, len(members), settings.LLM_BATCH_SIZE):
+                group = members[i:i + settings.LLM_BATCH_SIZE]
+                group_futures = [futures[agent_data['id']] for agent_data in group]
+                task = asyncio.create_task(self._decide_group(group, context, group_futures))
+
+                def cancel_if_abandoned(_, task=task, group_futures=group_futures):
+                    if all(future.cancelled() for future in group_futures):
+                        task.cancel()
+
+                for future in group_futures:
+                    future.add_done_callback(cancel_if_abandoned)
+
+        return futures
+
+    async def _decide_group(self, group: List[Dict[str, Any]], context: Dict[str, Any],
+                            futures: List[asyncio.Future]):
+        """Resolve a group's futures from one batched request, falling back to single requests"""
+        def settle(future: asyncio.Future, action: Optional[Action]):
+            if not future.done():
+                future.set_result(action)
+
+        actions = {}
+        if len(group) > 1:
+            try:
+                actions = await self.mistral.generate_batch_actions(group, context)
+            except Exception as e:
+                print(f"Error generating batched actions: {str(e)}")
+
+        async def decide_single(agent_data: Dict[str, Any], future: asyncio.Future):
+            try:
+                action = await self.decide_agent_action(agent_data['id'], context)
+            except Exception as e:
+                print(f"Error generating action for agent {agent_data['id']}: {str(e)}")
+                action = None
+            settle(future, action)
+
+        fallbacks = []
+        for agent_data, future in zip(group, futures):
+            if agent_data['id'] in actions:
+                settle(future, Action(**actions[agent_data['id']]))
+            elif not future.done():
+                fallbacks.append(decide_single(agent_data, future))
+        await asyncio.gather(*fallbacks)
+
+    def _speaking_calls(self, agent_data: Dict[str, Any], context: Dict[str, Any], on_speech):
+        """Call factory whose speech reaches `on_speech` from one request only.
+
+        When a request is hedged, whichever copy starts speaking first owns
+        the stream so spectators never see two interleaved versions.
+        """
+        owner = []
+
+        def make_call():
+            call_id = object()
+
+            async def speech(action_type: str, content: str):
+                if not owner:
+                    owner.append(call_id)
+                if owner[0] is call_id:
+                    await on_speech(action_type, content)
+
+            return self.mistral.generate_action(agent_data, context, on_speech=speech)
+
+        return make_call
+
+    async def _hedged(self, make_call):
+        """Run make_call(), sending a duplicate if it hasn't answered within LLM_HEDGE_AFTER seconds.
+
+        The first non-empty answer wins and the other request is cancelled.
+        """
+        if settings.LLM_HEDGE_AFTER <= 0:
+            return await make_call()
+
+        primary = asyncio.create_task(make_call())
+        hedge = None
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=settings.LLM_HEDGE_AFTER)
+            if not done:
+                hedge = asyncio.create_task(make_call())
+                pending.add(hedge)
+                self.hedge_stats['sent'] += 1
+
+            while True:
+                for task in done:
+                    if task.result():
+                        if task is hedge:
+                            self.hedge_stats['won'] += 1
+                        return task.result()
+                if not pending:
+                    return None
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
     async def clear_all_agents(self) -> int:
         """Delete all agents and return count of deleted agents"""
         agents = await self.list_agents()
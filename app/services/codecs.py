@@ -0,0 +1,150 @@
+import json
+import yaml
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Optional accelerated / binary codecs
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Codec(ABC):
+    """Encodes records to bytes and back; `extension` identifies files written with it"""
+
+    name = "base"
+    extension = ""
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        """Encode one record"""
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        """Decode one record"""
+
+
+class StreamCodec(Codec):
+    """A codec that can also encode append-only streams, used for action logs"""
+
+    @abstractmethod
+    def dumps_stream_item(self, obj: Any) -> bytes:
+        """Encode one item of an append-only stream"""
+
+    @abstractmethod
+    def loads_stream(self, data: bytes) -> List[Any]:
+        """Decode every complete item of a stream, skipping a torn tail"""
+
+
+class YamlCodec(Codec):
+    """Profiles only: YAML has no cheap append form, so it is not a StreamCodec"""
+
+    name = "yaml"
+    extension = ".yml"
+
+    def dumps(self, obj: Any) -> bytes:
+        dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+        return yaml.dump(obj, Dumper=dumper, default_flow_style=False, sort_keys=False).encode()
+
+    def loads(self, data: bytes) -> Any:
+        # The C loader is several times faster when libyaml is available
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+        return yaml.load(data, Loader=loader)
+
+
+class JsonCodec(StreamCodec):
+    """Compact JSON, using orjson when it is installed"""
+
+    name = "json"
+    extension = ".json"
+
+    def dumps(self, obj: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(obj)
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    def loads(self, data: bytes) -> Any:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+    def dumps_stream_item(self, obj: Any) -> bytes:
+        return self.dumps(obj) + b"\n"
+
+    def loads_stream(self, data: bytes) -> List[Any]:
+        items = []
+        for line in data.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(self.loads(line))
+            except ValueError:
+                # A torn final line from an interrupted append
+                print("[Storage] Skipping corrupt JSON log line")
+        return items
+
+
+class MsgpackCodec(StreamCodec):
+    name = "msgpack"
+    extension = ".msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise ValueError("The msgpack storage format requires the 'msgpack' package")
+
+    def dumps(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+    def dumps_stream_item(self, obj: Any) -> bytes:
+        return self.dumps(obj)
+
+    def loads_stream(self, data: bytes) -> List[Any]:
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(data)
+        items = []
+        try:
+            for item in unpacker:
+                items.append(item)
+        except (ValueError, msgpack.UnpackException):
+            print("[Storage] Skipping corrupt msgpack log tail")
+        return items
+
+
+CODECS = {codec.name: codec for codec in (YamlCodec, JsonCodec, MsgpackCodec)}
+
+
+def get_codec(name: str) -> Codec:
+    """Instantiate a codec by name ("yaml", "json" or "msgpack")"""
+    if name not in CODECS:
+        raise ValueError(f"Unknown storage format: {name}")
+    return CODECS[name]()
+
+
+def available_codecs() -> Dict[str, Codec]:
+    """Every codec usable in this environment"""
+    codecs = {}
+    for name in CODECS:
+        try:
+            codecs[name] = get_codec(name)
+        except ValueError:
+            pass
+    return codecs
+
+
+def codec_for_path(path: Path) -> Codec:
+    """Detect a file's codec from its extension"""
+    for name, codec in CODECS.items():
+        if path.name.endswith(codec.extension):
+            return get_codec(name)
+    raise ValueError(f"Unrecognized storage file: {path.name}")
@@ -1,14 +1,34 @@
+import time
+import random
 import asyncio
-from typing import Dict, Any, List, Optional
+from collections import deque
+from typing import Dict, Any, List, Optional, Deque
 from datetime import datetime
 from app.models.game import GameState, Character, TurnContext, MapInfo
 from app.models.action import Action, ActionType, GameAction
 from app.services.agent_service import AgentService
+from app.services.snapshot_service import SnapshotService
+from app.services.codecs import JsonCodec
 from app.config import settings
 
+
+class MaterializedState:
+    """A GameState together with its encoded JSON and ETag, built once per state version"""
+
+    def __init__(self, key: tuple, state: GameState, etag: str):
+        self.key = key
+        self.state = state
+        self.etag = etag
+        self.data = state.model_dump(mode='json')
+        self.body = JsonCodec().dumps(self.data)
+        self.text = self.body.decode()
+
+
 class GameService:
-    def __init__(self, agent_service: AgentService):
+    def __init__(self, agent_service: AgentService, snapshot_service: Optional[SnapshotService] = None):
         self.agent_service = agent_service
+        self.snapshots = snapshot_service
+        self._snapshot_task = None
         self.current_map = MapInfo(
             id="map-plaza001",
             description="The bustling central plaza where citizens gather to discuss and debate"
@@ -18,20 +38,92 @@ class GameService:
         self.turn_task = None
         self.turn_number = 0
         self.current_turn_actions = {}  # Store actions for current turn only
+        # Bumped whenever turn, map or displayed actions change; see get_state_snapshot
+        self.state_version = 0
+        self._materialized: Optional[MaterializedState] = None
+        # Distinguishes ETags of this process from those of a previous run with the same counters
+        self._epoch = f"{int(time.time()):x}"
+
+        # Long-poll support: the last fully applied turn and an event set when the next one is
+        self.completed_turn = 0
+        self._turn_completed = asyncio.Event()
+        # Decisions already in flight for the next turn: carried-over stragglers and pipelined requests
+        self._pending_decisions: Dict[str, asyncio.Future] = {}
+        # Latest speech frame per agent from pipelined decisions, held until their turn starts
+        self._held_speech: Dict[str, Dict[str, Any]] = {}
+        self.straggler_stats = {'timed_out': 0, 'carried_over': 0, 'last_turn': 0}
+
+        self.loop_stats = {
+            'turns': 0, 'last_lag_ms': 0.0, 'last_duration_ms': 0.0, 'last_overrun_ms': 0.0,
+            'max_lag_ms': 0.0, 'overruns': 0, 'skipped_slots': 0
+        }
+
+        # Single-flight turn execution
+        self._turn_in_flight: Optional[asyncio.Task] = None
+        self.flight_stats = {'coalesced': 0, 'loop_skipped': 0, 'loop_queued': 0}
+
+        # Asynchronous clock mode (SIMULATION_MODE=async)
+        self._clocks: Dict[str, asyncio.Task] = {}  # per-agent clock tasks
+        self._events: Deque[TurnContext] = deque()  # rolling window of recent events
+        self._event_lock = asyncio.Lock()
 
     async def get_game_state(self) -> GameState:
         """Get current game state with all agents as characters"""
-        agents = await self.agent_service.list_agents()
+        return (await self.get_state_snapshot()).state
+
+    async def get_state_snapshot(self) -> MaterializedState:
+        """Current state with its pre-encoded payload, rebuilt only when something changed"""
+        key = self._state_key()
+        if self._materialized is None or self._materialized.key != key:
+            self._materialized = MaterializedState(key, await self._build_game_state(), self._etag_for(key))
+        return self._materialized
+
+    def _state_key(self) -> tuple:
+        return self.turn_number, self.state_version, self.agent_service.storage.generation
+
+    def _etag_for(self, key: tuple) -> str:
+        turn, version, generation = key
+        return f'"{turn}.{version}.{generation}.{self._epoch}"'
+
+    def state_etag(self) -> str:
+        """ETag of the current state, known without materializing it"""
+        return self._etag_for(self._state_key())
+
+    async def wait_for_turn(self, turn: int, timeout: float) -> bool:
+        """Wait until turn `turn` has completed; False if `timeout` seconds pass first"""
+        deadline = time.monotonic() + timeout
+        while self.completed_turn < turn:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._turn_completed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def _complete_turn(self):
+        """Wake requests waiting for this turn"""
+        self.completed_turn = self.turn_number
+        self._turn_completed.set()
+        self._turn_completed = asyncio.Event()
+
+    def _touch_state(self):
+        """Invalidate the materialized state after a change outside the agent registry"""
+        self.state_version += 1
+
+    async def _build_game_state(self) -> GameState:
+        agents = await self.agent_service.storage.project_agents(['id', 'name', 'character_id', 'visible'])
         characters = {}
 
         for agent in agents:
-            if agent.visible:
+            if agent['visible']:
                 # Only show actions from the current turn
-                recent_action = self.current_turn_actions.get(agent.id)
+                recent_action = self.current_turn_actions.get(agent['id'])
 
-                characters[agent.id] = Character(
-                    name=agent.name,
-                    character_id=getattr(agent, 'character_id', None),
+                characters[agent['id']] = Character(
+                    name=agent['name'],
+                    character_id=agent['character_id'],
                     action=recent_action
                 )
 
@@ -41,26 +133,56 @@ class GameService:
             map={"id": self.current_map.id, "description": self.current_map.description}
         )
 
-    async def execute_turn(self) -> TurnContext:
-        """Execute one game turn where all agents decide their actions"""
+    async def execute_turn(self, prefetch_next: bool = False) -> TurnContext:
+        """Execute one game turn where all agents decide their actions.
+
+        Single-flight: if a turn is already running, the caller joins it and
+        receives its TurnContext instead of starting a second one. With
+        `prefetch_next` the next turn's decisions are requested as soon as
+        this turn's context is known.
+        """
+        if self.turn_in_progress:
+            self.flight_stats['coalesced'] += 1
+            print(f"[GameService] Turn {self.turn_number} already running, joining it")
+        else:
+            self._turn_in_flight = asyncio.create_task(self._execute_turn(prefetch_next))
+        # Shielded so a caller going away (e.g. a dropped HTTP request) can't cancel the turn for everyone
+        return await asyncio.shield(self._turn_in_flight)
+
+    @property
+    def turn_in_progress(self) -> bool:
+        return self._turn_in_flight is not None and not self._turn_in_flight.done()
+
+    @property
+    def applying_turn(self) -> bool:
+        """A lockstep turn or an async-mode event is being applied right now"""
+        return self.turn_in_progress or self._event_lock.locked()
+
+    async def _execute_turn(self, prefetch_next: bool) -> TurnContext:
+        # Every storage mutation made during the turn is flushed in one batch at the end
+        async with self.agent_service.storage.batch(
+            write_behind=settings.STORAGE_WRITE_BEHIND,
+            turn=self.turn_number + 1
+        ):
+            context = await self._run_turn(prefetch_next)
+        # Still inside the single-flight task, so the next turn can't start mid-capture
+        await self._snapshot_after_turn()
+        return context
+
+    async def _run_turn(self, prefetch_next: bool = False) -> TurnContext:
         # Clear previous turn's actions
         self.current_turn_actions.clear()
 
         # Increment turn number
         self.turn_number += 1
+        self._touch_state()
         print(f"\n=== EXECUTING TURN {self.turn_number} ===")
 
         agents = await self.agent_service.list_agents()
         print(f"Found {len(agents)} total agents")
 
         # Build context from last turn
-        context = {
-            'map_description': self.current_map.description,
-            'speakers': self.last_context.speakers,
-            'private_messages': self.last_context.private_messages,
-            'arrivals': self.last_context.arrivals,
-            'departures': self.last_context.departures
-        }
+        context = self._agent_context(self.last_context)
 
         # Clear context for new turn
         new_context = TurnContext()
@@ -80,15 +202,12 @@ class GameService:
                     target=enter_action.target,
                     content=enter_action.content
                 )
+                self._touch_state()
                 await self._process_action(agent, enter_action, new_context)
                 await self.agent_service.add_agent_action(agent.id, enter_action)
 
                 # Clear pending_entry flag
-                agent_data = await self.agent_service.storage.load_agent(agent.id)
-                if agent_data:
-                    agent_data['pending_entry'] = False
-                    agent_data['visible'] = True
-                    await self.agent_service.storage.save_agent(agent.id, agent_data)
+                await self.agent_service.complete_entry(agent.id)
 
         # Handle agents pending deletion - they should leave
         agents_to_delete = []
@@ -106,12 +225,14 @@ class GameService:
                     target=leave_action.target,
                     content=leave_action.content
                 )
+                self._touch_state()
                 await self._process_action(agent, leave_action, new_context)
                 await self.agent_service.add_agent_action(agent.id, leave_action)
                 agents_to_delete.append(agent.id)
 
         # Generate actions for all other visible agents in parallel
-        tasks = []
+        tasks = {}
+        deciding = []
         visible_agents = []
         for agent in agents:
             # Check if agent should take a turn (visible, not pending deletion, not pending entry)
@@ -119,26 +240,40 @@ class GameService:
             is_pending_entry = getattr(agent, 'pending_entry', False)
 
             if agent.visible and not is_pending_deletion and not is_pending_entry:
-                print(f"  Asking agent {agent.name} (ID: {agent.id}) to take their turn")
                 visible_agents.append(agent)
-                tasks.append(self._generate_agent_action(agent.id, context))
+                if agent.id in self._pending_decisions:
+                    # Decision started before this turn (carried over or pipelined): use it
+                    print(f"  Agent {agent.name} (ID: {agent.id}) already has a decision in flight")
+                    tasks[agent.id] = self._pending_decisions.pop(agent.id)
+                else:
+                    print(f"  Asking agent {agent.name} (ID: {agent.id}) to take their turn")
+                    deciding.append(agent.id)
             else:
                 print(f"  Skipping agent {agent.name}: visible={agent.visible}, pending_deletion={is_pending_deletion}, pending_entry={is_pending_entry}")
 
-        print(f"  Waiting for {len(tasks)} agents to decide their actions...")
-        # Wait for all actions
-        actions = await asyncio.gather(*tasks) if tasks else []
+        tasks.update(await self._start_decisions(deciding, context))
+
+        # Drop early decisions of agents that are no longer taking turns
+        for task in self._pending_decisions.values():
+            task.cancel()
+        self._pending_decisions.clear()
+
+        await self._release_held_speech()
+        actions = await self._collect_actions(visible_agents, tasks)
 
         # Process actions and build new context
-        for agent, action in zip(visible_agents, actions):
+        for agent in visible_agents:
+            action = actions.get(agent.id)
             if action:
                 print(f"    Agent {agent.name} action: {action.type.value if hasattr(action.type, 'value') else action.type}")
+                await self.agent_service.add_agent_action(agent.id, action)
                 # Store action for current turn display
                 self.current_turn_actions[agent.id] = GameAction(
                     type=action.type.value if hasattr(action.type, 'value') else action.type,
                     target=action.target,
                     content=action.content
                 )
+                self._touch_state()
                 await self._process_action(agent, action, new_context)
             else:
                 print(f"    Agent {agent.name} did not generate an action")
@@ -151,8 +286,13 @@ class GameService:
         # Update last context
         self.last_context = new_context
 
+        if prefetch_next:
+            # Next turn's context is final: start its decisions while this turn is broadcast and persisted
+            await self._prefetch_decisions()
+
         # Broadcast state update to all WebSocket clients
         await self._broadcast_state_update()
+        self._complete_turn()
 
         print(f"=== TURN {self.turn_number} COMPLETE ===\n")
         return new_context
@@ -161,15 +301,115 @@ class GameService:
         """Broadcast state update to all connected WebSocket clients"""
         try:
             from app.routers.websocket import manager
-            state = await self.get_game_state()
-            await manager.broadcast_state(state.model_dump())
+            await manager.broadcast_state(await self.get_state_snapshot())
         except Exception as e:
             print(f"[GameService] Failed to broadcast state: {e}")
 
-    async def _generate_agent_action(self, agent_id: str, context: Dict[str, Any]) -> Optional[Action]:
-        """Generate action for a single agent"""
+    def _speech_publisher(self, agent_id: str, turn: Optional[int] = None):
+        """Callback pushing an agent's partial speech to spectators, at most every SPEECH_FRAME_INTERVAL"""
+        turn = self.turn_number if turn is None else turn
+        last_sent = 0.0
+
+        async def publish(action_type: str, content: str):
+            nonlocal last_sent
+            now = time.monotonic()
+            if now - last_sent < settings.SPEECH_FRAME_INTERVAL:
+                return
+            last_sent = now
+            frame = {
+                'type': 'speech',
+                'turn': turn,
+                'agent_id': agent_id,
+                'action': action_type,
+                'content': content
+            }
+            if turn > self.turn_number:
+                # Pipelined decision: spectators are still watching the previous turn
+                self._held_speech[agent_id] = frame
+                return
+            await self._broadcast_speech(frame)
+
+        return publish
+
+    async def _broadcast_speech(self, frame: Dict[str, Any]):
+        try:
+            from app.routers.websocket import manager
+            await manager.broadcast(frame)
+        except Exception as e:
+            print(f"[GameService] Failed to broadcast speech: {e}")
+
+    async def _release_held_speech(self):
+        """Send the speech held for the turn that is now being collected; drop older leftovers"""
+        held = self._held_speech
+        self._held_speech = {}
+        for frame in held.values():
+            if frame['turn'] == self.turn_number:
+                await self._broadcast_speech(frame)
+
+    async def _start_decisions(self, agent_ids: List[str], context: Dict[str, Any],
+                               turn: Optional[int] = None) -> Dict[str, asyncio.Future]:
+        """Request decisions for agents (batched if enabled); one future per agent"""
+        if settings.LLM_BATCH_DECISIONS and len(agent_ids) > 1:
+            return await self.agent_service.decide_agent_actions_batched(agent_ids, context)
+        return {
+            agent_id: asyncio.create_task(self._generate_agent_action(agent_id, context, turn))
+            for agent_id in agent_ids
+        }
+
+    async def _prefetch_decisions(self):
+        """Start next turn's decisions for every agent that will take it"""
+        agents = await self.agent_service.list_agents()
+        agent_ids = [
+            agent.id for agent in agents
+            if agent.visible and not agent.pending_deletion and not agent.pending_entry
+            and agent.id not in self._pending_decisions
+        ]
+        if agent_ids:
+            print(f"  Pipelining: requesting turn {self.turn_number + 1} decisions for {len(agent_ids)} agents")
+            self._pending_decisions.update(await self._start_decisions(
+                agent_ids, self._agent_context(self.last_context), turn=self.turn_number + 1
+            ))
+
+    async def _collect_actions(self, agents: List[Any], tasks: Dict[str, asyncio.Future]) -> Dict[str, Optional[Action]]:
+        """Wait for agent decisions until TURN_DEADLINE, then apply the straggler policy"""
+        if not tasks:
+            return {}
+
+        deadline = settings.TURN_DEADLINE if settings.TURN_DEADLINE > 0 else None
+        print(f"  Waiting for {len(tasks)} agents to decide their actions"
+              + (f" (deadline {deadline}s)..." if deadline else "..."))
+        await asyncio.wait(tasks.values(), timeout=deadline)
+
+        actions = {}
+        stragglers = 0
+        for agent in agents:
+            task = tasks[agent.id]
+            if task.done():
+                actions[agent.id] = None if task.cancelled() else task.result()
+                continue
+
+            stragglers += 1
+            if settings.TURN_STRAGGLER_POLICY == "carry_over":
+                # Keep waiting in the background; the answer is used next turn
+                print(f"    Agent {agent.name} missed the deadline, carrying their decision over")
+                self._pending_decisions[agent.id] = task
+                self.straggler_stats['carried_over'] += 1
+            else:
+                print(f"    Agent {agent.name} missed the deadline, doing nothing this turn")
+                task.cancel()
+                actions[agent.id] = Action(type=ActionType.NOTHING)
+                self.straggler_stats['timed_out'] += 1
+
+        self.straggler_stats['last_turn'] = stragglers
+        return actions
+
+    async def _generate_agent_action(self, agent_id: str, context: Dict[str, Any],
+                                     turn: Optional[int] = None) -> Optional[Action]:
+        """Decide the action for a single agent (recorded once the turn collects it)"""
         try:
-            return await self.agent_service.generate_agent_action(agent_id, context)
+            return await self.agent_service.decide_agent_action(
+                agent_id, context, on_speech=self._speech_publisher(agent_id, turn)
+            )
         except Exception as e:
             print(f"Error generating action for agent {agent_id}: {str(e)}")
             return None
@@ -214,11 +454,24 @@ class GameService:
             # Make agent invisible
             await self.agent_service.update_agent_visibility(agent.id, False)
 
+    def _agent_context(self, turn_context: TurnContext) -> Dict[str, Any]:
+        """What agents are told about the room when deciding"""
+        return {
+            'map_description': self.current_map.description,
+            'speakers': turn_context.speakers,
+            'private_messages': turn_context.private_messages,
+            'arrivals': turn_context.arrivals,
+            'departures': turn_context.departures
+        }
+
     async def start_turn_loop(self):
-        """Start automatic turn execution"""
+        """Start automatic turn execution (lockstep turns or per-agent clocks, per SIMULATION_MODE)"""
         if not self.turn_running:
             self.turn_running = True
-            self.turn_task = asyncio.create_task(self._turn_loop())
+            if settings.SIMULATION_MODE == "async":
+                self.turn_task = asyncio.create_task(self._clock_loop())
+            else:
+                self.turn_task = asyncio.create_task(self._turn_loop())
 
     async def stop_turn_loop(self):
         """Stop automatic turn execution"""
@@ -229,24 +482,276 @@ class GameService:
                 await self.turn_task
             except asyncio.CancelledError:
                 pass
+        # Pipelined decisions were made for turns that won't run on schedule
+        for task in self._pending_decisions.values():
+            task.cancel()
+        self._pending_decisions.clear()
+        self._held_speech.clear()
 
     async def _turn_loop(self):
-        """Background task for automatic turns"""
-        print(f"[Turn Loop] Starting automatic turn execution (interval: {settings.GAME_TURN_INTERVAL}s)")
+        """Background task for automatic turns, started on a fixed wall-clock cadence.
+
+        Turn k is scheduled at start + k * GAME_TURN_INTERVAL regardless of how
+        long turns take. A turn that overruns its period delays the next one;
+        slots missed entirely are skipped rather than run back to back.
+        """
+        period = settings.GAME_TURN_INTERVAL
+        print(f"[Turn Loop] Starting automatic turn execution (period: {period}s, "
+              f"pipelining: {settings.TURN_PIPELINING})")
+        next_start = time.monotonic()
         while self.turn_running:
+            started = time.monotonic()
+            lag = started - next_start
             try:
-                print(f"[Turn Loop] Executing automatic turn...")
-                await self.execute_turn()
-                print(f"[Turn Loop] Waiting {settings.GAME_TURN_INTERVAL} seconds until next turn...")
-                await asyncio.sleep(settings.GAME_TURN_INTERVAL)
+                await self._scheduled_turn()
             except Exception as e:
                 print(f"[Turn Loop] Error: {str(e)}")
                 import traceback
                 traceback.print_exc()
-                await asyncio.sleep(settings.GAME_TURN_INTERVAL)
+            duration = time.monotonic() - started
+
+            next_start += period
+            now = time.monotonic()
+            skipped = 0
+            if now - next_start >= period:
+                skipped = int((now - next_start) // period)
+                next_start += skipped * period
+            self._record_loop_timing(lag, duration, period, skipped)
+            await asyncio.sleep(max(0.0, next_start - now))
+
+    async def _scheduled_turn(self):
+        """Run the loop's turn, honouring TURN_LOOP_CONFLICT if a manual turn is running"""
+        if self.turn_in_progress:
+            if settings.TURN_LOOP_CONFLICT == "queue":
+                # Let the running turn finish, then run this slot's own turn
+                self.flight_stats['loop_queued'] += 1
+                print(f"[Turn Loop] Turn {self.turn_number} in progress, queueing behind it")
+                await asyncio.gather(asyncio.shield(self._turn_in_flight), return_exceptions=True)
+            else:
+                # The running turn stands in for this slot
+                self.flight_stats['loop_skipped'] += 1
+                print(f"[Turn Loop] Turn {self.turn_number} in progress, skipping this slot")
+                await asyncio.shield(self._turn_in_flight)
+                return
+        await self.execute_turn(prefetch_next=settings.TURN_PIPELINING)
+
+    def _record_loop_timing(self, lag: float, duration: float, period: float, skipped: int):
+        """Report one automatic turn's scheduling lag and overrun"""
+        overrun = max(0.0, duration - period)
+        stats = self.loop_stats
+        stats['turns'] += 1
+        stats['last_lag_ms'] = round(lag * 1000, 1)
+        stats['last_duration_ms'] = round(duration * 1000, 1)
+        stats['last_overrun_ms'] = round(overrun * 1000, 1)
+        stats['max_lag_ms'] = max(stats['max_lag_ms'], stats['last_lag_ms'])
+        stats['overruns'] += 1 if overrun > 0 else 0
+        stats['skipped_slots'] += skipped
+        print(f"[Turn Loop] Turn {self.turn_number} took {duration:.2f}s "
+              f"(lag {lag * 1000:.0f}ms, overrun {overrun * 1000:.0f}ms"
+              + (f", skipped {skipped} slots" if skipped else "") + ")")
+
+    async def _clock_loop(self):
+        """Asynchronous mode: every agent acts on its own clock.
+
+        This supervisor handles arrivals and departures and keeps one clock
+        task per active agent; each action is applied and broadcast as soon as
+        it is decided, and agents see a rolling window of recent events.
+        """
+        print(f"[Clock] Starting asynchronous agent clocks (tick: {settings.AGENT_TICK_INTERVAL}s, "
+              f"window: {settings.EVENT_WINDOW_SECONDS}s)")
+        try:
+            while self.turn_running:
+                try:
+                    await self._supervise_clocks()
+                except Exception as e:
+                    print(f"[Clock] Error: {str(e)}")
+                    import traceback
+                    traceback.print_exc()
+                await asyncio.sleep(1)
+        finally:
+            for task in self._clocks.values():
+                task.cancel()
+            self._clocks.clear()
+
+    async def _supervise_clocks(self):
+        """Apply pending entries/departures and start or stop agent clocks"""
+        agents = await self.agent_service.list_agents()
+        active = set()
+
+        for agent in agents:
+            if agent.pending_entry and not agent.visible:
+                print(f"  [Clock] Agent {agent.name} is entering the room")
+                await self._apply_event(agent, Action(
+                    type=ActionType.ENTER,
+                    content=f"Hello everyone! I'm {agent.name}."
+                ))
+                await self.agent_service.complete_entry(agent.id)
+            elif agent.pending_deletion and agent.visible:
+                print(f"  [Clock] Agent {agent.name} is leaving the room")
+                await self._apply_event(agent, Action(
+                    type=ActionType.LEAVE,
+                    content=f"Goodbye everyone, it's time for me to go!"
+                ))
+                await self.agent_service.permanently_delete_agent(agent.id)
+            elif agent.visible and not agent.pending_entry and not agent.pending_deletion:
+                active.add(agent.id)
+                if agent.id not in self._clocks or self._clocks[agent.id].done():
+                    self._clocks[agent.id] = asyncio.create_task(self._agent_clock(agent.id))
+
+        for agent_id in list(self._clocks):
+            if agent_id not in active:
+                self._clocks.pop(agent_id).cancel()
+
+    async def _agent_clock(self, agent_id: str):
+        """Decide and apply one agent's actions, one tick at a time"""
+        interval = settings.AGENT_TICK_INTERVAL
+        jitter = settings.AGENT_TICK_JITTER
+        # Random phase so agents don't all tick together
+        await asyncio.sleep(random.uniform(0, interval))
+
+        while True:
+            agent = await self.agent_service.get_agent(agent_id)
+            if agent is None or not agent.visible or agent.pending_deletion:
+                return
+
+            try:
+                action = await asyncio.wait_for(
+                    self._generate_agent_action(agent_id, self._agent_context(self._window_context())),
+                    timeout=settings.TURN_DEADLINE if settings.TURN_DEADLINE > 0 else None
+                )
+            except asyncio.TimeoutError:
+                print(f"  [Clock] Agent {agent.name} missed the deadline, skipping this tick")
+                self.straggler_stats['timed_out'] += 1
+                action = None
+
+            if action:
+                await self._apply_event(agent, action)
+            await asyncio.sleep(interval * random.uniform(1 - jitter, 1 + jitter))
+
+    async def _apply_event(self, agent: Any, action: Action):
+        """Record one agent's action as its own turn and broadcast it immediately"""
+        async with self._event_lock:
+            async with self.agent_service.storage.batch(
+                write_behind=settings.STORAGE_WRITE_BEHIND,
+                turn=self.turn_number + 1
+            ):
+                self.turn_number += 1
+                print(f"  [Clock] Event {self.turn_number}: {agent.name} "
+                      f"{action.type.value if hasattr(action.type, 'value') else action.type}")
+                await self.agent_service.add_agent_action(agent.id, action)
+                # The broadcast carries only the action that just happened
+                self.current_turn_actions = {
+                    agent.id: GameAction(
+                        type=action.type.value if hasattr(action.type, 'value') else action.type,
+                        target=action.target,
+                        content=action.content
+                    )
+                }
+                self._touch_state()
+                event_context = TurnContext()
+                await self._process_action(agent, action, event_context)
+                self._events.append(event_context)
+                self.last_context = self._window_context()
+
+            await self._broadcast_state_update()
+            self._complete_turn()
+            await self._snapshot_after_turn()
+
+    def _window_context(self) -> TurnContext:
+        """Merge the events of the last EVENT_WINDOW_SECONDS into one context"""
+        cutoff = datetime.now().timestamp() - settings.EVENT_WINDOW_SECONDS
+        while self._events and self._events[0].timestamp.timestamp() < cutoff:
+            self._events.popleft()
+
+        window = TurnContext()
+        for event in self._events:
+            window.speakers.extend(event.speakers)
+            window.private_messages.extend(event.private_messages)
+            window.movements.extend(event.movements)
+            window.arrivals.extend(event.arrivals)
+            window.departures.extend(event.departures)
+        return window
+
+    def export_state(self) -> Dict[str, Any]:
+        """Game state that lives only in memory, as plain values"""
+        return {
+            'turn_number': self.turn_number,
+            'current_map': self.current_map.model_dump(),
+            'last_context': self.last_context.model_dump(mode='json'),
+            'current_turn_actions': {
+                agent_id: action.model_dump() for agent_id, action in self.current_turn_actions.items()
+            },
+        }
+
+    def restore_state(self, state: Dict[str, Any]):
+        """Restore state produced by export_state"""
+        self.turn_number = state['turn_number']
+        self.current_map = MapInfo(**state['current_map'])
+        self.last_context = TurnContext(**state['last_context'])
+        self.current_turn_actions = {
+            agent_id: GameAction(**action) for agent_id, action in state['current_turn_actions'].items()
+        }
+        self._touch_state()
+        self.completed_turn = self.turn_number
+        print(f"[GameService] Restored world at turn {self.turn_number}")
+
+    async def _capture_snapshot(self) -> Dict[str, Any]:
+        """Game state, agent records and backend stamps; call only between turns"""
+        storage = self.agent_service.storage
+        # Stamp the backend before exporting: every committed write was applied
+        # to the registry first, so the records are never older than the stamps
+        await storage.flush()
+        stamps = await asyncio.to_thread(storage.backend.stamps)
+        return {
+            'game_state': self.export_state(),
+            'records': storage.export_records(),
+            'backend_name': storage.backend.name,
+            'stamps': stamps,
+        }
+
+    async def _snapshot_after_turn(self):
+        """Capture a snapshot every SNAPSHOT_INTERVAL_TURNS and write it in the background"""
+        if not self.snapshots or self.turn_number % settings.SNAPSHOT_INTERVAL_TURNS != 0:
+            return
+        if self._snapshot_task and not self._snapshot_task.done():
+            return
+        captured = await self._capture_snapshot()
+        self._snapshot_task = asyncio.create_task(self.snapshots.save(**captured))
+
+    async def save_snapshot(self):
+        """Snapshot the game state and the agent registry once no turn is being applied"""
+        if not self.snapshots:
+            return
+        if self._turn_in_flight is not None:
+            await asyncio.gather(self._turn_in_flight, return_exceptions=True)
+        async with self._event_lock:
+            captured = await self._capture_snapshot()
+        await self.snapshots.save(**captured)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Runtime metrics for the turn pipeline"""
+        return {
+            'turn': self.turn_number,
+            'llm': self.agent_service.mistral.scheduler.metrics(),
+            'tokens': self.agent_service.mistral.token_metrics(),
+            'parsing': self.agent_service.mistral.parse_metrics(),
+            'cache': self.agent_service.mistral.cache.metrics() if self.agent_service.mistral.cache else None,
+            'batches': dict(self.agent_service.mistral.batch_stats),
+            'hedges': dict(self.agent_service.hedge_stats),
+            'stragglers': dict(self.straggler_stats),
+            'loop': dict(self.loop_stats),
+            'single_flight': dict(self.flight_stats),
+            'websocket': self._websocket_metrics(),
+        }
+
+    @staticmethod
+    def _websocket_metrics() -> Dict[str, Any]:
+        from app.routers.websocket import manager
+        return manager.metrics()
 
     def change_map(self, map_id: str, description: str):
         """Change the current map"""
         self.current_map = MapInfo(id=map_id, description=description)
+        self._touch_state()
         # Clear context when map changes
         self.last_context = TurnContext()
\ No newline at end of file
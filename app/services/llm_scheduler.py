@@ -0,0 +1,188 @@
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Lower values are served first
+PRIORITY_ADDRESSED = 0  # agent was spoken to directly last turn
+PRIORITY_NORMAL = 10
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an SDK / httpx error, if it carries one"""
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds requested by a Retry-After header, if any"""
+    response = getattr(error, "raw_response", None) or getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors and transport failures are worth retrying"""
+    import httpx
+
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts: halved on 429s, recovered on successes"""
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttle(self):
+        self.rate = max(self.max_rate / 16, self.rate / 2)
+
+    def recover(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class LLMScheduler:
+    """Admission control in front of the LLM provider.
+
+    Requests wait for one of `max_in_flight` slots (lowest priority value
+    first, FIFO within a priority) and for a rate-limit token, then run.
+    Retryable failures (429, 5xx, transport errors) release the slot, back off
+    with full jitter (or the server's Retry-After) and queue again.
+    """
+
+    def __init__(self, max_in_flight: int, rate_per_second: float, burst: int,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.max_in_flight = max_in_flight
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.in_flight = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttled = 0
+        self.max_queue_depth = 0
+        self._wait_times = deque(maxlen=1000)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def _acquire_slot(self, priority: int):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        try:
+            await future  # the releasing request hands its slot over
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_slot()  # slot was handed to us just as we were cancelled
+            else:
+                self._waiters = [w for w in self._waiters if w[2] is not future]
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release_slot(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # slot passes straight to the next waiter
+                return
+        self.in_flight -= 1
+
+    async def submit(self, call: Callable[[], Awaitable[T]], priority: int = PRIORITY_NORMAL) -> T:
+        """Run `call()` once admitted, retrying retryable failures"""
+        self.submitted += 1
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            await self._acquire_slot(priority)
+            try:
+                await self.bucket.acquire()
+                self._wait_times.append(time.monotonic() - queued_at)
+                result = await call()
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                error = e
+            else:
+                self.completed += 1
+                self.bucket.recover()
+                return result
+            finally:
+                self._release_slot()
+
+            attempt += 1
+            self.retries += 1
+            if _status_code(error) == 429:
+                self.throttled += 1
+                self.bucket.throttle()
+            delay = _retry_after(error)
+            if delay is None:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            print(f"    [LLM] {type(error).__name__} (status {_status_code(error)}), "
+                  f"retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def metrics(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_times)
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rate_limit": round(self.bucket.rate, 3),
+            "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int((len(waits) - 1) * 0.95)] * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
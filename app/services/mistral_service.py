@@ -1,16 +1,57 @@
 import os
-from typing import Dict, Any, Optional, List
+from types import SimpleNamespace
+from typing import Dict, Any, Optional, List, Callable, Awaitable
+import httpx
 from mistralai import Mistral
 import json
 from app.config import settings
 from app.models.action import ActionType
+from app.services.llm_scheduler import LLMScheduler, PRIORITY_ADDRESSED, PRIORITY_NORMAL
+from app.services.response_cache import ResponseCache
+from app.services.action_parser import (
+    SpeechStreamExtractor, action_response_format, parse_action, validate_action
+)
+
+# Called with (action_type, partial_content) while a speech action streams in
+SpeechCallback = Callable[[str, str], Awaitable[None]]
+SPEECH_ACTIONS = {ActionType.SAY.value, ActionType.SPEAK_TO.value, ActionType.ENTER.value, ActionType.LEAVE.value}
 
 class MistralService:
     def __init__(self):
         self.api_key = settings.MISTRAL_API_KEY
         if not self.api_key:
             raise ValueError("MISTRAL_API_KEY is required")
-        self.client = Mistral(api_key=self.api_key)
+        # One pooled async HTTP client shared by every agent, so concurrent
+        # requests reuse keep-alive connections instead of blocking the event loop
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.MISTRAL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.MISTRAL_MAX_CONNECTIONS
+            ),
+            timeout=settings.MISTRAL_TIMEOUT
+        )
+        self.client = Mistral(api_key=self.api_key, async_client=self.http_client)
+        # Every action request goes through the scheduler to stay under provider limits
+        self.scheduler = LLMScheduler(
+            max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+            rate_per_second=settings.LLM_RATE_LIMIT,
+            burst=settings.LLM_RATE_BURST,
+            max_retries=settings.LLM_MAX_RETRIES,
+            backoff_base=settings.LLM_BACKOFF_BASE,
+            backoff_max=settings.LLM_BACKOFF_MAX
+        )
+        self.batch_stats = {'requests': 0, 'agents': 0, 'fallbacks': 0}
+        self.token_stats: Dict[str, Dict[str, int]] = {}
+        self.parse_stats: Dict[str, Dict[str, int]] = {}
+        # Opt-in cache of answers to byte-identical prompts (quiet rooms repeat them)
+        self.cache = ResponseCache(
+            max_entries=settings.LLM_CACHE_SIZE,
+            ttl=settings.LLM_CACHE_TTL
+        ) if settings.LLM_CACHE_ENABLED else None
+
+    async def close(self):
+        """Close the pooled HTTP client"""
+        await self.http_client.aclose()
 
     async def create_agent(self, name: str, instructions: str, model: str = None, temperature: float = None) -> Dict[str, Any]:
         """Create a new Mistral agent"""
@@ -19,11 +60,11 @@ class MistralService:
             prefixed_name = f"agora-{name}" if not name.startswith("agora-") else name
 
             # Use beta.agents API for Mistral SDK
-            agent = self.client.beta.agents.create(
+            agent = await self.client.beta.agents.create_async(
                 model=model or settings.MISTRAL_MODEL,
                 name=prefixed_name,
                 description=f"Agent: {name}",  # Add description field
-                instructions=instructions,
+                instructions=self._remote_instructions(name, instructions),
                 completion_args={
                     "temperature": temperature or settings.MISTRAL_TEMPERATURE
                 }
@@ -38,11 +79,31 @@ class MistralService:
         except Exception as e:
             raise Exception(f"Failed to create Mistral agent: {str(e)}")
 
+    async def update_agent_instructions(self, mistral_id: str, name: str, instructions: str) -> bool:
+        """Install the current action rules on an existing remote agent"""
+        try:
+            await self.client.beta.agents.update_async(
+                agent_id=mistral_id,
+                instructions=self._remote_instructions(name, instructions)
+            )
+            return True
+        except Exception as e:
+            print(f"Warning: Failed to update Mistral agent {mistral_id}: {str(e)}")
+            return False
+
+    @staticmethod
+    def _remote_instructions(name: str, instructions: str) -> str:
+        """Instructions stored on the remote agent: personality plus the action rules"""
+        from app.prompts.action_prompts import AGENT_INSTRUCTIONS
+
+        name = name[len("agora-"):] if name.startswith("agora-") else name
+        return AGENT_INSTRUCTIONS.format(agent_name=name, agent_instructions=instructions)
+
     async def list_agents(self) -> List[Dict[str, Any]]:
         """List all Mistral agents with 'agora' prefix"""
         try:
             # Use beta.agents API to list agents
-            agents_response = self.client.beta.agents.list()
+            agents_response = await self.client.beta.agents.list_async()
             agents_list = agents_response.data if hasattr(agents_response, 'data') else []
 
             # Filter only agents with "agora" prefix
@@ -67,35 +128,82 @@ class MistralService:
         """Delete a Mistral agent"""
         try:
             # Use beta.agents API for deletion
-            self.client.beta.agents.delete(mistral_id)
+            await self.client.beta.agents.delete_async(agent_id=mistral_id)
             return True
         except Exception as e:
             print(f"Warning: Failed to delete Mistral agent {mistral_id}: {str(e)}")
             return False
 
-    async def generate_action(self, agent_data: Dict[str, Any], context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Generate an action for an agent based on context"""
+    async def generate_action(self, agent_data: Dict[str, Any], context: Dict[str, Any],
+                              on_speech: Optional[SpeechCallback] = None) -> Optional[Dict[str, Any]]:
+        """Generate an action for an agent based on context.
+
+        With `on_speech` (and LLM_STREAMING on) the completion is streamed and
+        `on_speech(action_type, partial_content)` is awaited as speech arrives.
+        """
         try:
             print(f"    [Mistral] Generating action for {agent_data.get('name', 'unknown')}")
-            # Build the prompt
-            prompt = self._build_action_prompt(agent_data, context)
+            priority = self._action_priority(agent_data, context)
 
-            # Create chat completion
-            response = self.client.chat.complete(
-                model=agent_data.get('model', settings.MISTRAL_MODEL),
-                messages=[
-                    {
-                        "role": "system",
-                        "content": agent_data['instructions']
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=agent_data.get('temperature', settings.MISTRAL_TEMPERATURE),
-                max_tokens=150
-            )
+            if self.uses_remote_agent(agent_data):
+                # The remote agent already holds the personality and rules: send only this turn's delta
+                mode = "remote_agent"
+                prompt = self._build_turn_prompt(agent_data, context)
+                cache_scope = f"{agent_data['mistral_id']}:{agent_data.get('remote_prompt_version')}"
+            else:
+                mode = "inline"
+                # Build the prompt
+                prompt = self._build_action_prompt(agent_data, context)
+                cache_scope = agent_data['instructions']
+
+            cache_key = self._cache_key(agent_data, mode, cache_scope, prompt)
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached:
+                    print(f"    [Mistral] Cache hit for {agent_data.get('name')}: {cached['type']}")
+                    return dict(cached)
+
+            if mode == "remote_agent":
+                endpoint = self.client.agents
+                request = {
+                    'agent_id': agent_data['mistral_id'],
+                    'messages': [
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ]
+                }
+            else:
+                endpoint = self.client.chat
+                request = {
+                    'model': agent_data.get('model', settings.MISTRAL_MODEL),
+                    'messages': [
+                        {
+                            "role": "system",
+                            "content": agent_data['instructions']
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    'temperature': agent_data.get('temperature', settings.MISTRAL_TEMPERATURE)
+                }
+            request.update(response_format=self._response_format(), max_tokens=150)
+
+            if settings.LLM_STREAMING and on_speech is not None:
+                # Stream so spectators see speech as soon as its first tokens arrive
+                response = await self.scheduler.submit(
+                    lambda: self._stream_completion(endpoint, request, on_speech),
+                    priority=priority
+                )
+            else:
+                response = await self.scheduler.submit(
+                    lambda: endpoint.complete_async(**request),
+                    priority=priority
+                )
+            self._track_usage(mode, response)
 
             if not response.choices:
                 print(f"    [Mistral] No response choices for {agent_data.get('name')}")
@@ -104,30 +212,16 @@ class MistralService:
             content = response.choices[0].message.content.strip()
             print(f"    [Mistral] Raw response: {content[:100]}...")  # First 100 chars
 
-            # Try to parse JSON response
-            try:
-                # Extract JSON from the response
-                start = content.find('{')
-                end = content.rfind('}') + 1
-                if start != -1 and end > 0:
-                    json_str = content[start:end]
-                    action_data = json.loads(json_str)
-
-                    # Validate action type
-                    if action_data.get('type') in [a.value for a in ActionType]:
-                        print(f"    [Mistral] Parsed action: {action_data.get('type')}")
-                        return {
-                            'type': action_data.get('type'),
-                            'target': action_data.get('target'),
-                            'content': action_data.get('content')
-                        }
-                    else:
-                        print(f"    [Mistral] Invalid action type: {action_data.get('type')}")
-            except json.JSONDecodeError as e:
-                print(f"    [Mistral] Failed to parse JSON: {e}")
+            action, error = parse_action(content)
+            self._track_parse(agent_data.get('model', settings.MISTRAL_MODEL), response, error)
+            if action:
+                print(f"    [Mistral] Parsed action: {action['type']}")
+                if cache_key:
+                    self.cache.put(cache_key, dict(action))
+                return action
 
             # Fallback to a default action
-            print(f"    [Mistral] Using fallback action: nothing")
+            print(f"    [Mistral] Could not parse action ({error}), using fallback action: nothing")
             return {
                 'type': ActionType.NOTHING.value,
                 'target': None,
@@ -138,22 +232,182 @@ class MistralService:
             print(f"Error generating action: {str(e)}")
             return None
 
-    def _build_action_prompt(self, agent_data: Dict[str, Any], context: Dict[str, Any]) -> str:
-        """Build the prompt for action generation"""
-        from app.prompts.action_prompts import ACTION_PROMPT
+    @staticmethod
+    def uses_remote_agent(agent_data: Dict[str, Any]) -> bool:
+        """Whether actions go through the agent's remote Mistral agent"""
+        from app.prompts.action_prompts import AGENT_PROMPT_VERSION
 
-        # Gather recent context
+        return (settings.LLM_USE_REMOTE_AGENTS
+                and bool(agent_data.get('mistral_id'))
+                and agent_data.get('remote_prompt_version') == AGENT_PROMPT_VERSION)
+
+    def _track_usage(self, mode: str, response: Any, agents: int = 1):
+        """Accumulate token usage per request mode"""
+        stats = self.token_stats.setdefault(mode, {
+            'requests': 0, 'agents': 0, 'prompt_tokens': 0, 'completion_tokens': 0
+        })
+        stats['requests'] += 1
+        stats['agents'] += agents
+        usage = getattr(response, 'usage', None)
+        if usage:
+            stats['prompt_tokens'] += usage.prompt_tokens or 0
+            stats['completion_tokens'] += usage.completion_tokens or 0
+
+    def _cache_key(self, agent_data: Dict[str, Any], mode: str, scope: str, prompt: str) -> Optional[tuple]:
+        """Response cache key for a request, or None if it shouldn't be cached"""
+        temperature = agent_data.get('temperature', settings.MISTRAL_TEMPERATURE)
+        if (self.cache is None or agent_data.get('bypass_cache')
+                or temperature > settings.LLM_CACHE_MAX_TEMPERATURE):
+            return None
+        return self.cache.make_key(
+            agent_data.get('model', settings.MISTRAL_MODEL),
+            temperature,
+            f"{mode}\n{scope}\n{prompt}"
+        )
+
+    @staticmethod
+    def _response_format() -> Optional[Dict[str, Any]]:
+        """JSON schema constraint for single actions, when structured output is on"""
+        return action_response_format() if settings.LLM_STRUCTURED_OUTPUT else None
+
+    def _track_parse(self, model: str, response: Any, error: Optional[str]):
+        """Count parse failures per model and the tokens spent on them"""
+        stats = self.parse_stats.setdefault(model, {'responses': 0, 'failures': 0, 'wasted_tokens': 0})
+        stats['responses'] += 1
+        if error:
+            stats['failures'] += 1
+            usage = getattr(response, 'usage', None)
+            if usage:
+                stats['wasted_tokens'] += usage.total_tokens or 0
+
+    def parse_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Parse failure rate and wasted tokens per model"""
+        return {
+            model: dict(stats, failure_rate=round(stats['failures'] / stats['responses'], 4))
+            for model, stats in self.parse_stats.items() if stats['responses']
+        }
+
+    def token_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Token usage per mode, with prompt tokens per agent decision"""
+        return {
+            mode: dict(stats, prompt_tokens_per_agent=round(stats['prompt_tokens'] / stats['agents'], 1))
+            for mode, stats in self.token_stats.items() if stats['agents']
+        }
+
+    @staticmethod
+    def _action_priority(agent_data: Dict[str, Any], context: Dict[str, Any]) -> int:
+        """Agents someone spoke to directly last turn are served first"""
+        for msg in context.get('private_messages', []):
+            if msg.get('to') == agent_data.get('name'):
+                return PRIORITY_ADDRESSED
+        return PRIORITY_NORMAL
+
+    async def _stream_completion(self, endpoint: Any, request: Dict[str, Any], on_speech: SpeechCallback) -> Any:
+        """Stream a completion, reporting the partial speech content as it arrives.
+
+        Returns an object shaped like a completion response (choices, usage).
+        """
+        extractor = SpeechStreamExtractor()
+        parts = []
+        usage = None
+        stream = await endpoint.stream_async(**request)
+        async with stream as events:
+            async for event in events:
+                chunk = event.data
+                if chunk.usage:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not isinstance(delta, str) or not delta:
+                    continue
+                parts.append(delta)
+                if extractor.feed(delta) and extractor.type in SPEECH_ACTIONS:
+                    await on_speech(extractor.type, extractor.content)
+
+        if not parts:
+            return SimpleNamespace(choices=[], usage=usage)
+        message = SimpleNamespace(content="".join(parts))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    async def generate_batch_actions(self, agents_data: List[Dict[str, Any]], context: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Decide actions for several agents sharing a model in one request.
+
+        Returns actions keyed by agent id; agents missing from the result
+        (unparseable or omitted entries) should be asked individually.
+        """
+        first = agents_data[0]
+        names = ", ".join(agent['name'] for agent in agents_data)
+        print(f"    [Mistral] Generating batched actions for {len(agents_data)} agents: {names}")
+        prompt = self._build_batch_prompt(agents_data, context)
+        priority = min(self._action_priority(agent, context) for agent in agents_data)
+
+        response = await self.scheduler.submit(
+            lambda: self.client.chat.complete_async(
+                model=first.get('model', settings.MISTRAL_MODEL),
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You direct several characters in a shared scene and answer with JSON only."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                temperature=first.get('temperature', settings.MISTRAL_TEMPERATURE),
+                max_tokens=150 * len(agents_data)
+            ),
+            priority=priority
+        )
+        self.batch_stats['requests'] += 1
+        self.batch_stats['agents'] += len(agents_data)
+        self._track_usage("batch", response, agents=len(agents_data))
+
+        if not response.choices:
+            print(f"    [Mistral] No response choices for batch")
+            return {}
+        content = response.choices[0].message.content.strip()
+        print(f"    [Mistral] Raw batch response: {content[:100]}...")
+
+        start = content.find('[')
+        end = content.rfind(']') + 1
+        try:
+            entries = json.loads(content[start:end]) if start != -1 and end > 0 else []
+        except json.JSONDecodeError as e:
+            print(f"    [Mistral] Failed to parse batch JSON: {e}")
+            entries = []
+
+        by_name = {agent['name']: agent['id'] for agent in agents_data}
+        wanted = set(by_name.values())
+        actions = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            # Accept the character's name if the model echoed it instead of the id
+            agent_id = entry.get('agent_id')
+            agent_id = agent_id if agent_id in wanted else by_name.get(agent_id)
+            action, error = validate_action(entry)
+            if error:
+                print(f"    [Mistral] Invalid batch entry for {agent_id}: {error}")
+            if agent_id and action and agent_id not in actions:
+                actions[agent_id] = action
+
+        missing = len(agents_data) - len(actions)
+        if missing:
+            self.batch_stats['fallbacks'] += missing
+            print(f"    [Mistral] Batch answered for {len(actions)}/{len(agents_data)} agents")
+        return actions
+
+    @staticmethod
+    def _shared_events(context: Dict[str, Any]) -> List[str]:
+        """Recent events everyone in the room witnessed"""
         recent_events = []
 
         if context.get('speakers'):
             for speaker in context['speakers'][-5:]:  # Last 5 speakers
                 recent_events.append(f"- {speaker['name']} said: \"{speaker['message']}\"")
 
-        if context.get('private_messages'):
-            for msg in context['private_messages'][-3:]:  # Last 3 private messages
-                if msg['to'] == agent_data['name']:
-                    recent_events.append(f"- {msg['from']} said to you: \"{msg['message']}\"")
-
         if context.get('arrivals'):
             for name in context['arrivals']:
                 recent_events.append(f"- {name} entered the room")
@@ -165,11 +419,67 @@ class MistralService:
                     msg += f" saying: \"{dep['message']}\""
                 recent_events.append(msg)
 
-        recent_context = "\n".join(recent_events) if recent_events else "Nothing notable happened recently."
+        return recent_events
+
+    @staticmethod
+    def _private_events(agent_name: str, context: Dict[str, Any]) -> List[str]:
+        """Messages addressed to one agent"""
+        return [
+            f"- {msg['from']} said to you: \"{msg['message']}\""
+            for msg in context.get('private_messages', [])[-3:]  # Last 3 private messages
+            if msg['to'] == agent_name
+        ]
+
+    def _agent_recent_context(self, agent_name: str, context: Dict[str, Any]) -> str:
+        """Recent events as seen by one agent, private messages included"""
+        recent_events = self._shared_events(context)
+        # Private messages go right after what was said aloud
+        speakers = len(context.get('speakers', [])[-5:])
+        recent_events[speakers:speakers] = self._private_events(agent_name, context)
+        return "\n".join(recent_events) if recent_events else "Nothing notable happened recently."
+
+    def _build_action_prompt(self, agent_data: Dict[str, Any], context: Dict[str, Any]) -> str:
+        """Build the prompt for action generation"""
+        from app.prompts.action_prompts import ACTION_PROMPT
+
+        # Gather recent context
+        recent_context = self._agent_recent_context(agent_data['name'], context)
 
         return ACTION_PROMPT.format(
             agent_name=agent_data['name'],
             map_description=context.get('map_description', 'A virtual agora where people gather'),
             agent_instructions=agent_data['instructions'],
             recent_context=recent_context
-        )
\ No newline at end of file
+        )
+
+    def _build_turn_prompt(self, agent_data: Dict[str, Any], context: Dict[str, Any]) -> str:
+        """Build the per-turn delta sent to a remote agent"""
+        from app.prompts.action_prompts import TURN_PROMPT
+
+        return TURN_PROMPT.format(
+            map_description=context.get('map_description', 'A virtual agora where people gather'),
+            recent_context=self._agent_recent_context(agent_data['name'], context)
+        )
+
+    def _build_batch_prompt(self, agents_data: List[Dict[str, Any]], context: Dict[str, Any]) -> str:
+        """Build one prompt deciding for several agents: shared scene once, then each character"""
+        from app.prompts.action_prompts import BATCH_ACTION_PROMPT, BATCH_CHARACTER_BLOCK
+
+        recent_events = self._shared_events(context)
+        recent_context = "\n".join(recent_events) if recent_events else "Nothing notable happened recently."
+
+        characters = []
+        for agent_data in agents_data:
+            private = self._private_events(agent_data['name'], context)
+            characters.append(BATCH_CHARACTER_BLOCK.format(
+                agent_id=agent_data['id'],
+                agent_name=agent_data['name'],
+                agent_instructions=agent_data['instructions'],
+                private_context=("Said to them privately:\n" + "\n".join(private)) if private else ""
+            ).strip())
+
+        return BATCH_ACTION_PROMPT.format(
+            map_description=context.get('map_description', 'A virtual agora where people gather'),
+            recent_context=recent_context,
+            characters="\n\n".join(characters)
+        )
@@ -0,0 +1,66 @@
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+CacheKey = Tuple[str, float, str]
+
+
+class ResponseCache:
+    """LRU cache of parsed LLM answers with a time-to-live.
+
+    Keys are (model, temperature bucket, prompt hash), so agents sharing a
+    model, a similar temperature and a byte-identical prompt share entries.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, temperature_step: float = 0.1):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.temperature_step = temperature_step
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def make_key(self, model: str, temperature: float, prompt: str) -> CacheKey:
+        bucket = round(round(temperature / self.temperature_step) * self.temperature_step, 3)
+        return model, bucket, hashlib.sha256(prompt.encode()).hexdigest()
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: CacheKey, value: Any) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
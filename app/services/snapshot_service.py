@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+from pathlib import Path
+from typing import Optional, Dict, Any
+from app.services.codecs import available_codecs, get_codec, codec_for_path
+from app.services.storage_backends import StorageBackend
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+class SnapshotService:
+    """Atomic snapshots of the whole world: game state plus the agent registry.
+
+    A snapshot is a single file written to a temporary name and renamed into
+    place, so a crash mid-write leaves the previous snapshot intact. msgpack
+    is used when installed, compact JSON otherwise.
+    """
+
+    def __init__(self, base_path: Path):
+        self.base_path = base_path
+        codecs = available_codecs()
+        self.codec = codecs.get("msgpack") or get_codec("json")
+        self._latest: Optional[Dict[str, Any]] = None
+        self._loaded = False
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self.base_path.with_name(self.base_path.name + self.codec.extension)
+
+    def _existing_path(self) -> Optional[Path]:
+        """The newest snapshot file on disk, in any format"""
+        candidates = [
+            self.base_path.with_name(self.base_path.name + codec.extension)
+            for codec in available_codecs().values() if codec.name != "yaml"
+        ]
+        existing = [path for path in candidates if path.exists()]
+        return max(existing, key=lambda path: path.stat().st_mtime) if existing else None
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Load the latest snapshot once; later calls return the cached copy"""
+        if self._loaded:
+            return self._latest
+        self._loaded = True
+
+        path = self._existing_path()
+        if path is None:
+            return None
+        try:
+            start = time.perf_counter()
+            snapshot = codec_for_path(path).loads(path.read_bytes())
+            if snapshot.get('format') != SNAPSHOT_FORMAT_VERSION:
+                print(f"[Snapshot] Ignoring {path.name}: unsupported format {snapshot.get('format')}")
+                return None
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"[Snapshot] Loaded {path.name} (turn {snapshot['game']['turn_number']}, "
+                  f"{len(snapshot['agents'])} agents) in {elapsed:.1f}ms")
+            self._latest = snapshot
+        except Exception as e:
+            print(f"[Snapshot] Failed to load {path.name}: {e}")
+        return self._latest
+
+    def restore_records(self, backend: StorageBackend) -> Optional[list]:
+        """Agent records from the latest snapshot, if the backend hasn't been written since"""
+        snapshot = self.latest()
+        if snapshot is None:
+            return None
+        if snapshot.get('backend') != backend.name:
+            print(f"[Snapshot] Snapshot was taken with the {snapshot.get('backend')} backend, doing a full load")
+            return None
+        if 'stamps' not in snapshot:
+            print("[Snapshot] Snapshot has no storage stamps, doing a full load")
+            return None
+
+        snapshot_stamps = snapshot['stamps']
+        stored_stamps = backend.stamps()
+        if snapshot_stamps != stored_stamps:
+            # Agents were created, deleted or written after the snapshot
+            changed = sum(
+                1 for agent_id in snapshot_stamps.keys() | stored_stamps.keys()
+                if snapshot_stamps.get(agent_id) != stored_stamps.get(agent_id)
+            )
+            print(f"[Snapshot] {changed} agents changed in storage since snapshot, doing a full load")
+            return None
+        return snapshot['agents']
+
+    def _write_sync(self, snapshot: Dict[str, Any]) -> int:
+        data = self.codec.dumps(snapshot)
+        path = self.path
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return len(data)
+
+    async def save(self, game_state: Dict[str, Any], records: list, backend_name: str,
+                   stamps: Dict[str, Any]) -> None:
+        """Write a snapshot atomically (encoding and I/O run in a worker thread).
+
+        `stamps` are the backend's per-agent stamps, taken no later than
+        `records`; a warm start only trusts the records while they still match.
+        """
+        snapshot = {
+            'format': SNAPSHOT_FORMAT_VERSION,
+            'created_at': time.time(),
+            'backend': backend_name,
+            'stamps': stamps,
+            'game': game_state,
+            'agents': records,
+        }
+        async with self._write_lock:
+            try:
+                start = time.perf_counter()
+                size = await asyncio.to_thread(self._write_sync, snapshot)
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"[Snapshot] Wrote turn {game_state['turn_number']} ({size} bytes) in {elapsed:.1f}ms")
+            except Exception as e:
+                print(f"[Snapshot] Failed to write snapshot: {e}")
@@ -0,0 +1,34 @@
+from typing import Any, Dict
+
+
+def diff_states(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Changes turning the encoded GameState `old` into `new`.
+
+    Characters that are new or whose identity changed are sent whole in
+    `added`; for the others only a changed `action` is sent. Keys without
+    changes are left out.
+    """
+    delta: Dict[str, Any] = {'turn': new['turn']}
+    old_characters = old['characters']
+    new_characters = new['characters']
+
+    removed = [character_id for character_id in old_characters if character_id not in new_characters]
+    added = {}
+    actions = {}
+    for character_id, character in new_characters.items():
+        previous = old_characters.get(character_id)
+        if (previous is None or previous['name'] != character['name']
+                or previous['character_id'] != character['character_id']):
+            added[character_id] = character
+        elif previous['action'] != character['action']:
+            actions[character_id] = character['action']
+
+    if removed:
+        delta['removed'] = removed
+    if added:
+        delta['added'] = added
+    if actions:
+        delta['actions'] = actions
+    if new['map'] != old['map']:
+        delta['map'] = new['map']
+    return delta
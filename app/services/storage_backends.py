@@ -0,0 +1,493 @@
+import os
+import json
+import sqlite3
+import asyncio
+import threading
+import aiofiles
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Set
+from datetime import datetime
+from app.services.codecs import Codec, StreamCodec, CODECS, get_codec, available_codecs, codec_for_path
+
+
+def serialize_action(action: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy an action with plain JSON/YAML friendly values"""
+    action = dict(action)
+    if 'timestamp' in action and hasattr(action['timestamp'], 'isoformat'):
+        action['timestamp'] = action['timestamp'].isoformat()
+    # Convert enum to string value
+    if 'type' in action and hasattr(action['type'], 'value'):
+        action['type'] = action['type'].value
+    return action
+
+
+def parse_action(action: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a stored action's ISO timestamp back to a datetime"""
+    if 'timestamp' in action and isinstance(action['timestamp'], str):
+        try:
+            action['timestamp'] = datetime.fromisoformat(action['timestamp'])
+        except:
+            pass
+    return action
+
+
+def serialize_profile(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy an agent record without its action history, with plain values"""
+    data = {key: value for key, value in data.items() if key != 'action_history'}
+    # Convert datetime objects to ISO format strings
+    if 'created_at' in data and hasattr(data['created_at'], 'isoformat'):
+        data['created_at'] = data['created_at'].isoformat()
+    return data
+
+
+def parse_profile(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a stored profile's ISO created_at back to a datetime"""
+    if 'created_at' in data and isinstance(data['created_at'], str):
+        try:
+            data['created_at'] = datetime.fromisoformat(data['created_at'])
+        except:
+            pass
+    return data
+
+
+class WriteBatch:
+    """The set of persistence operations a StorageService hands to its backend.
+
+    While the batch is open it only records agent ids; `freeze()` copies the
+    profiles and replaced histories out of the registry so a write-behind
+    commit can't observe later mutations.
+    """
+
+    def __init__(self):
+        self.profiles: Dict[str, Any] = {}  # agent_id -> profile without history
+        self.appends: Dict[str, List[Dict[str, Any]]] = {}  # agent_id -> new actions, oldest first
+        self.replacements: Dict[str, Any] = {}  # agent_id -> full history, newest first
+        self.deletes: Set[str] = set()
+        self.frozen = False
+
+    def save_profile(self, agent_id: str) -> None:
+        self.profiles[agent_id] = None
+        if agent_id in self.deletes:
+            # Re-created after a delete in the same batch: rewrite its history too
+            self.deletes.discard(agent_id)
+            self.replace_history(agent_id)
+
+    def append(self, agent_id: str, action: Dict[str, Any]) -> None:
+        if agent_id not in self.replacements:
+            self.appends.setdefault(agent_id, []).append(action)
+
+    def replace_history(self, agent_id: str) -> None:
+        # The replacement covers every action appended so far
+        self.replacements[agent_id] = None
+        self.appends.pop(agent_id, None)
+
+    def delete(self, agent_id: str) -> None:
+        self.profiles.pop(agent_id, None)
+        self.appends.pop(agent_id, None)
+        self.replacements.pop(agent_id, None)
+        self.deletes.add(agent_id)
+
+    def freeze(self, agents: Dict[str, Dict[str, Any]]) -> "WriteBatch":
+        self.frozen = True
+        self.profiles = {
+            agent_id: serialize_profile(agents[agent_id])
+            for agent_id in self.profiles if agent_id in agents
+        }
+        self.replacements = {
+            agent_id: [serialize_action(action) for action in agents[agent_id].get('action_history', [])]
+            for agent_id in self.replacements if agent_id in agents
+        }
+        self.appends = {
+            agent_id: [serialize_action(action) for action in actions]
+            for agent_id, actions in self.appends.items() if agent_id in agents
+        }
+        return self
+
+    def agent_ids(self) -> Set[str]:
+        """Every agent the batch writes to"""
+        return set(self.profiles) | set(self.appends) | set(self.replacements) | self.deletes
+
+    def __len__(self) -> int:
+        return len(self.profiles) + len(self.appends) + len(self.replacements) + len(self.deletes)
+
+
+class StorageBackend(ABC):
+    """Persistence layer behind StorageService's in-memory registry"""
+
+    name = "base"
+
+    @abstractmethod
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """Load every agent record, action history newest first"""
+
+    @abstractmethod
+    def load_agent(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Load a single agent record straight from storage"""
+
+    @abstractmethod
+    async def commit(self, batch: WriteBatch) -> None:
+        """Persist a frozen batch of writes"""
+
+    @abstractmethod
+    def list_ids(self) -> Set[str]:
+        """Ids of every stored agent, without loading the records"""
+
+    @abstractmethod
+    def stamps(self) -> Dict[str, Any]:
+        """A cheap per-agent marker that changes whenever the agent's stored data is written"""
+
+    def action_counts(self) -> Dict[str, int]:
+        """Number of stored action entries per agent, used to schedule compaction"""
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+class FileBackend(StorageBackend):
+    """One profile file plus one append-only action log per agent.
+
+    On disk each agent has a profile (`agent-<id>.yml`, `.json` or
+    `.msgpack`: everything except the action history) and an action log
+    (`agent-<id>.actions.jsonl`, or `.actions.msgpack` for the msgpack format;
+    one action per entry, oldest first). Appending an action writes a single
+    entry; a history replacement rewrites the log atomically.
+
+    Files are written in `file_format`. Loading detects the format from the
+    extension, so files in any other format still load and are rewritten in
+    the configured one on the spot.
+    """
+
+    name = "file"
+
+    def __init__(self, agents_dir: Path, file_format: str = "yaml"):
+        self.agents_dir = agents_dir
+        self.agents_dir.mkdir(exist_ok=True)
+        self.codec = get_codec(file_format)
+        # YAML has no cheap append form, so YAML profiles keep JSON-lines logs
+        self.log_codec: StreamCodec = self.codec if isinstance(self.codec, StreamCodec) else get_codec("json")
+        self._log_lines: Dict[str, int] = {}
+
+    def _profile_path(self, agent_id: str, codec: Optional[Codec] = None) -> Path:
+        return self.agents_dir / f"{agent_id}{(codec or self.codec).extension}"
+
+    def _log_path(self, agent_id: str, codec: Optional[Codec] = None) -> Path:
+        codec = codec or self.log_codec
+        return self.agents_dir / f"{agent_id}.actions{'.msgpack' if codec.name == 'msgpack' else '.jsonl'}"
+
+    def _find(self, agent_id: str, path_for) -> Optional[Path]:
+        """The agent's file in the configured format, else in any readable one"""
+        for codec in (self.codec, *available_codecs().values()):
+            path = path_for(agent_id, codec)
+            if path.exists():
+                return path
+        return None
+
+    def list_ids(self) -> Set[str]:
+        agent_ids = set()
+        for file_path in self.agents_dir.glob("agent-*"):
+            for codec in CODECS.values():
+                if file_path.name.endswith(codec.extension) and ".actions." not in file_path.name:
+                    agent_ids.add(file_path.name[:-len(codec.extension)])
+        return agent_ids
+
+    def stamps(self) -> Dict[str, Any]:
+        # Modification time and size of every profile and log file, by agent
+        stamps: Dict[str, Any] = {}
+        for file_path in sorted(self.agents_dir.glob("agent-*")):
+            if file_path.name.endswith(".tmp"):
+                continue
+            agent_id = file_path.name.split(".", 1)[0]
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            stamps.setdefault(agent_id, []).append([file_path.name, stat.st_mtime_ns, stat.st_size])
+        return stamps
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        agents = {}
+        self._log_lines = {}
+        for agent_id in sorted(self.list_ids()):
+            try:
+                data = self.load_agent(agent_id)
+            except Exception as e:
+                print(f"[Storage] Failed to load {agent_id}: {e}")
+                continue
+            if data:
+                agents[agent_id] = data
+        return agents
+
+    def load_agent(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        from app.config import settings
+
+        profile_path = self._find(agent_id, self._profile_path)
+        if profile_path is None:
+            return None
+        data = codec_for_path(profile_path).loads(profile_path.read_bytes())
+        if not data:
+            return None
+        parse_profile(data)
+
+        # Profiles written before the action log existed carry their history inline
+        legacy_history = [parse_action(action) for action in data.pop('action_history', None) or []]
+        log_path = self._find(agent_id, self._log_path)
+        logged = []
+        if log_path is not None:
+            log_codec = get_codec("msgpack" if log_path.suffix == ".msgpack" else "json")
+            logged = [parse_action(action) for action in log_codec.loads_stream(log_path.read_bytes())]
+        history = list(reversed(logged)) + legacy_history
+        data['action_history'] = history[:settings.MAX_ACTION_HISTORY]
+        self._log_lines[agent_id] = len(logged)
+
+        # Inline histories and files in another format are rewritten in the configured one
+        foreign_log = log_path is not None and log_path != self._log_path(agent_id)
+        if legacy_history or foreign_log:
+            self._replace_sync(agent_id, [serialize_action(action) for action in data['action_history']])
+            self._log_lines[agent_id] = len(data['action_history'])
+            if foreign_log:
+                log_path.unlink()
+        if legacy_history or profile_path != self._profile_path(agent_id):
+            self._profile_path(agent_id).write_bytes(self.codec.dumps(serialize_profile(data)))
+            if profile_path != self._profile_path(agent_id):
+                profile_path.unlink()
+                print(f"[Storage] Converted {profile_path.name} to {self.codec.name}")
+
+        return data
+
+    def action_counts(self) -> Dict[str, int]:
+        return dict(self._log_lines)
+
+    async def _write_profile(self, agent_id: str, profile: Dict[str, Any]) -> None:
+        async with aiofiles.open(self._profile_path(agent_id), 'wb') as f:
+            await f.write(self.codec.dumps(profile))
+
+    async def _append(self, agent_id: str, actions: List[Dict[str, Any]]) -> None:
+        async with aiofiles.open(self._log_path(agent_id), 'ab') as f:
+            await f.write(b"".join(self.log_codec.dumps_stream_item(action) for action in actions))
+
+    def _replace_sync(self, agent_id: str, history: List[Dict[str, Any]]) -> None:
+        """Rewrite an agent's log to exactly `history` (newest first in memory)"""
+        log_path = self._log_path(agent_id)
+        tmp_path = log_path.with_name(log_path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(b"".join(self.log_codec.dumps_stream_item(action) for action in reversed(history)))
+        os.replace(tmp_path, log_path)
+
+    def _delete_sync(self, agent_id: str) -> None:
+        for file_path in (self._profile_path(agent_id), self._log_path(agent_id)):
+            if file_path.exists():
+                file_path.unlink()
+
+    async def commit(self, batch: WriteBatch) -> None:
+        writes = []
+        for agent_id, profile in batch.profiles.items():
+            writes.append(self._write_profile(agent_id, profile))
+        for agent_id, actions in batch.appends.items():
+            writes.append(self._append(agent_id, actions))
+        for agent_id, history in batch.replacements.items():
+            writes.append(asyncio.to_thread(self._replace_sync, agent_id, history))
+
+        results = await asyncio.gather(*writes, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+
+        for agent_id in batch.deletes:
+            try:
+                self._delete_sync(agent_id)
+            except OSError as e:
+                errors.append(e)
+
+        if errors:
+            # Every write was attempted; the caller decides whether a failure is fatal
+            raise errors[0]
+
+
+class SqliteBackend(StorageBackend):
+    """Single SQLite database in WAL mode.
+
+    `agents` holds one row per agent (the full profile as JSON plus a few
+    columns worth filtering on); `actions` holds one row per action with an
+    index on (agent_id, turn). Each batch commits in a single transaction.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS agents (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            visible INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS actions (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_id TEXT NOT NULL,
+            turn INTEGER,
+            type TEXT NOT NULL,
+            target TEXT,
+            content TEXT,
+            timestamp TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_actions_agent_turn ON actions (agent_id, turn, seq);
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared across worker threads, serialized by _db_lock
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _action_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        return parse_action({
+            'type': row['type'],
+            'target': row['target'],
+            'content': row['content'],
+            'timestamp': row['timestamp'],
+            'turn': row['turn'],
+        })
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        from app.config import settings
+
+        with self._db_lock:
+            agents = {
+                row['id']: parse_profile(json.loads(row['data']))
+                for row in self._conn.execute("SELECT id, data FROM agents ORDER BY id")
+            }
+            for agent in agents.values():
+                agent['action_history'] = []
+            rows = self._conn.execute(
+                """SELECT * FROM (
+                       SELECT *, ROW_NUMBER() OVER (PARTITION BY agent_id ORDER BY seq DESC) AS rn
+                       FROM actions
+                   ) WHERE rn <= ? ORDER BY agent_id, seq DESC""",
+                (settings.MAX_ACTION_HISTORY,)
+            )
+            for row in rows:
+                if row['agent_id'] in agents:
+                    agents[row['agent_id']]['action_history'].append(self._action_from_row(row))
+        return agents
+
+    def list_ids(self) -> Set[str]:
+        with self._db_lock:
+            return {row['id'] for row in self._conn.execute("SELECT id FROM agents")}
+
+    def stamps(self) -> Dict[str, Any]:
+        # Actions are only ever inserted with a fresh seq, so the newest seq
+        # changes with every append or history rewrite
+        with self._db_lock:
+            return {
+                row['id']: [row['version'], row['size'], row['last_seq']]
+                for row in self._conn.execute(
+                    """SELECT agents.id AS id, json_extract(agents.data, '$.version') AS version,
+                              length(agents.data) AS size, MAX(actions.seq) AS last_seq
+                       FROM agents LEFT JOIN actions ON actions.agent_id = agents.id
+                       GROUP BY agents.id"""
+                )
+            }
+
+    def load_agent(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        from app.config import settings
+
+        with self._db_lock:
+            row = self._conn.execute("SELECT data FROM agents WHERE id = ?", (agent_id,)).fetchone()
+            if row is None:
+                return None
+            data = parse_profile(json.loads(row['data']))
+            data['action_history'] = [
+                self._action_from_row(action_row)
+                for action_row in self._conn.execute(
+                    "SELECT * FROM actions WHERE agent_id = ? ORDER BY seq DESC LIMIT ?",
+                    (agent_id, settings.MAX_ACTION_HISTORY)
+                )
+            ]
+        return data
+
+    def query_actions(self, agent_id: str, since_turn: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Actions recorded for an agent from `since_turn` on, newest first"""
+        with self._db_lock:
+            return [
+                self._action_from_row(row)
+                for row in self._conn.execute(
+                    "SELECT * FROM actions WHERE agent_id = ? AND turn >= ? ORDER BY seq DESC LIMIT ?",
+                    (agent_id, since_turn, limit)
+                )
+            ]
+
+    def action_counts(self) -> Dict[str, int]:
+        with self._db_lock:
+            return {
+                row['agent_id']: row['n']
+                for row in self._conn.execute("SELECT agent_id, COUNT(*) AS n FROM actions GROUP BY agent_id")
+            }
+
+    @staticmethod
+    def _action_params(agent_id: str, action: Dict[str, Any]):
+        return (
+            agent_id,
+            action.get('turn'),
+            action.get('type'),
+            action.get('target'),
+            action.get('content'),
+            action.get('timestamp'),
+        )
+
+    def _commit_sync(self, batch: WriteBatch) -> None:
+        insert_action = "INSERT INTO actions (agent_id, turn, type, target, content, timestamp) VALUES (?, ?, ?, ?, ?, ?)"
+        with self._db_lock, self._conn:
+            for agent_id in batch.deletes:
+                self._conn.execute("DELETE FROM agents WHERE id = ?", (agent_id,))
+                self._conn.execute("DELETE FROM actions WHERE agent_id = ?", (agent_id,))
+
+            self._conn.executemany(
+                """INSERT INTO agents (id, name, visible, created_at, data) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(id) DO UPDATE SET name = excluded.name, visible = excluded.visible,
+                   created_at = excluded.created_at, data = excluded.data""",
+                [
+                    (agent_id, profile.get('name', ''), int(bool(profile.get('visible'))),
+                     profile.get('created_at'), json.dumps(profile))
+                    for agent_id, profile in batch.profiles.items()
+                ]
+            )
+
+            for agent_id, history in batch.replacements.items():
+                self._conn.execute("DELETE FROM actions WHERE agent_id = ?", (agent_id,))
+                self._conn.executemany(
+                    insert_action,
+                    [self._action_params(agent_id, action) for action in reversed(history)]
+                )
+
+            self._conn.executemany(
+                insert_action,
+                [
+                    self._action_params(agent_id, action)
+                    for agent_id, actions in batch.appends.items()
+                    for action in actions
+                ]
+            )
+
+    async def commit(self, batch: WriteBatch) -> None:
+        await asyncio.to_thread(self._commit_sync, batch)
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._conn.close()
+
+
+def create_backend(kind: str, agents_dir: Path, sqlite_path: Optional[Path] = None,
+                   file_format: str = "yaml") -> StorageBackend:
+    """Build the storage backend named by STORAGE_BACKEND"""
+    if kind == FileBackend.name:
+        return FileBackend(agents_dir, file_format)
+    if kind == SqliteBackend.name:
+        return SqliteBackend(sqlite_path or agents_dir / "agora.db")
+    raise ValueError(f"Unknown storage backend: {kind}")
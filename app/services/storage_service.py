@@ -1,109 +1,321 @@
-import yaml
-import aiofiles
+import zlib
+import random
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Set
 import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from app.services.storage_backends import (
+    StorageBackend, FileBackend, WriteBatch,
+    serialize_action, serialize_profile, parse_action, parse_profile
+)
+
+class VersionConflictError(Exception):
+    """Raised when a save is based on an outdated version of an agent record"""
 
 class StorageService:
-    def __init__(self, agents_dir: Path):
+    """Agent storage with a resident in-memory registry, written through to a StorageBackend"""
+
+    def __init__(self, agents_dir: Path, backend: Optional[StorageBackend] = None,
+                 records: Optional[List[Dict[str, Any]]] = None):
         self.agents_dir = agents_dir
-        self.agents_dir.mkdir(exist_ok=True)
-        self._lock = asyncio.Lock()
+        from app.config import settings
 
-    async def save_agent(self, agent_id: str, data: Dict[str, Any]) -> None:
-        """Save agent data to YAML file"""
-        async with self._lock:
-            file_path = self.agents_dir / f"{agent_id}.yml"
-
-            # Convert datetime objects to ISO format strings
-            if 'created_at' in data and hasattr(data['created_at'], 'isoformat'):
-                data['created_at'] = data['created_at'].isoformat()
-
-            if 'action_history' in data:
-                for action in data['action_history']:
-                    if 'timestamp' in action and hasattr(action['timestamp'], 'isoformat'):
-                        action['timestamp'] = action['timestamp'].isoformat()
-                    # Convert enum to string value
-                    if 'type' in action and hasattr(action['type'], 'value'):
-                        action['type'] = action['type'].value
-
-            yaml_content = yaml.dump(data, default_flow_style=False, sort_keys=False)
-            async with aiofiles.open(file_path, 'w') as f:
-                await f.write(yaml_content)
+        self.backend = backend or FileBackend(agents_dir)
+        # Mutations of one agent hold its stripe only while changing the registry;
+        # the backend write is awaited after release
+        self._locks = [asyncio.Lock() for _ in range(settings.STORAGE_LOCK_STRIPES)]
+        # Authoritative after the initial load: reads never touch the backend
+        self._agents: Dict[str, Dict[str, Any]] = {}
+        self._log_lines: Dict[str, int] = {}
+        # Bumped on every registry mutation so readers can cache derived views
+        self.generation = 0
 
-    async def load_agent(self, agent_id: str) -> Optional[Dict[str, Any]]:
-        """Load agent data from YAML file"""
-        file_path = self.agents_dir / f"{agent_id}.yml"
-        if not file_path.exists():
+        # Unit of work state for batch(), scoped to the opening task's context
+        self._batch: ContextVar[Optional[WriteBatch]] = ContextVar(f"storage_batch_{id(self)}", default=None)
+        self._current_turn: ContextVar[Optional[int]] = ContextVar(f"storage_turn_{id(self)}", default=None)
+        # Newest commit touching each agent; commits are chained per agent so
+        # an agent's writes reach the backend in the order they were made
+        self._pending_commits: Dict[str, asyncio.Task] = {}
+
+        if records is not None:
+            # Warm start from a world snapshot instead of scanning the backend
+            self._set_registry({
+                record['id']: self._import_record(record) for record in records
+            })
+            print(f"[Storage] Restored {len(self._agents)} agents from snapshot")
+        else:
+            self.reload()
+
+    def reload(self) -> int:
+        """(Re)load the registry from the backend"""
+        self._set_registry(self.backend.load_all())
+        print(f"[Storage] Loaded {len(self._agents)} agents into registry ({self.backend.name} backend)")
+        return len(self._agents)
+
+    def _set_registry(self, agents: Dict[str, Dict[str, Any]]) -> None:
+        self._agents = agents
+        self.generation += 1
+        for data in self._agents.values():
+            data.setdefault('version', 0)
+        counts = self.backend.action_counts()
+        self._log_lines = {
+            agent_id: counts.get(agent_id, len(data.get('action_history', [])))
+            for agent_id, data in self._agents.items()
+        }
+
+    def export_records(self) -> List[Dict[str, Any]]:
+        """Every agent record with plain (snapshot friendly) values"""
+        records = []
+        for data in self._agents.values():
+            record = serialize_profile(data)
+            record['action_history'] = [serialize_action(action) for action in data.get('action_history', [])]
+            records.append(record)
+        return records
+
+    @staticmethod
+    def _import_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        data = parse_profile(dict(record))
+        data['action_history'] = [parse_action(dict(action)) for action in record.get('action_history', [])]
+        return data
+
+    def _lock_for(self, agent_id: str) -> asyncio.Lock:
+        """The lock stripe guarding an agent's record"""
+        return self._locks[zlib.crc32(agent_id.encode()) % len(self._locks)]
+
+    @staticmethod
+    def _copy(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a record so callers can mutate it without touching the registry"""
+        record = dict(data)
+        if 'action_history' in record:
+            record['action_history'] = [dict(action) for action in record['action_history']]
+        return record
+
+    def _open_batch(self) -> Optional[WriteBatch]:
+        """The batch open in the current task, if any"""
+        batch = self._batch.get()
+        # A task started inside a batch that outlives it writes through
+        return batch if batch is not None and not batch.frozen else None
+
+    def _writes(self) -> WriteBatch:
+        """The open batch, or a fresh one for a single write-through mutation"""
+        batch = self._open_batch()
+        return batch if batch is not None else WriteBatch()
+
+    def _submit(self, writes: WriteBatch) -> Optional[asyncio.Task]:
+        """Queue the writes of one mutation, unless they belong to the open batch.
+
+        Called while the agent's lock is held, so the writes are copied and
+        ordered before the next mutation; the caller awaits the returned task
+        after releasing the lock.
+        """
+        if writes is self._open_batch():
             return None
+        return self._schedule_commit(writes.freeze(self._agents))
+
+    def _append_action(self, writes: WriteBatch, agent_id: str, action: Dict[str, Any]) -> None:
+        """Append one action to the backend, compacting when it grows too long"""
+        from app.config import settings
+
+        writes.append(agent_id, action)
+        self._log_lines[agent_id] = self._log_lines.get(agent_id, 0) + 1
+
+        if self._log_lines[agent_id] > settings.ACTION_LOG_COMPACT_THRESHOLD:
+            writes.replace_history(agent_id)
+            self._log_lines[agent_id] = len(self._agents[agent_id].get('action_history', []))
+
+    async def save_agent(self, agent_id: str, data: Dict[str, Any]) -> None:
+        """Save agent data to the registry and the backend.
+
+        If `data` carries a `version` it must match the stored record's,
+        otherwise VersionConflictError is raised and nothing is written.
+        """
+        async with self._lock_for(agent_id):
+            previous = self._agents.get(agent_id)
+            current_version = previous.get('version', 0) if previous else 0
+            if previous and data.get('version') is not None and data['version'] != current_version:
+                raise VersionConflictError(
+                    f"Agent {agent_id} is at version {current_version}, save was based on {data['version']}"
+                )
+
+            record = self._copy(data)
+            record['version'] = current_version + 1
+            record.setdefault('action_history', [])
+            for action in record['action_history']:
+                # Keep the registry in the same shape load_agent returns
+                if 'type' in action and hasattr(action['type'], 'value'):
+                    action['type'] = action['type'].value
 
-        async with aiofiles.open(file_path, 'r') as f:
-            content = await f.read()
-            data = yaml.safe_load(content)
+            previous_history = previous.get('action_history', []) if previous else []
+            self._agents[agent_id] = record
+            self.generation += 1
+            writes = self._writes()
+            writes.save_profile(agent_id)
 
-            # Convert ISO strings back to datetime objects if needed
-            if 'created_at' in data and isinstance(data['created_at'], str):
-                try:
-                    data['created_at'] = datetime.fromisoformat(data['created_at'])
-                except:
-                    pass
+            # Only rewrite the stored actions if the caller actually changed the history
+            if record['action_history'] != previous_history:
+                writes.replace_history(agent_id)
+                self._log_lines[agent_id] = len(record['action_history'])
+            commit = self._submit(writes)
+        if commit is not None:
+            await commit
 
-            if 'action_history' in data:
-                for action in data['action_history']:
-                    if 'timestamp' in action and isinstance(action['timestamp'], str):
-                        try:
-                            action['timestamp'] = datetime.fromisoformat(action['timestamp'])
-                        except:
-                            pass
+    async def update_agent(self, agent_id: str, mutate: Callable[[Dict[str, Any]], None]) -> Optional[Dict[str, Any]]:
+        """Optimistic read-modify-write: apply `mutate` to a copy and save it, retrying on conflicts.
 
-            return data
+        Returns the saved record, or None if the agent doesn't exist.
+        """
+        from app.config import settings
+
+        for attempt in range(settings.STORAGE_UPDATE_RETRIES):
+            agent_data = await self.load_agent(agent_id)
+            if agent_data is None:
+                return None
+            mutate(agent_data)
+            try:
+                await self.save_agent(agent_id, agent_data)
+                agent_data['version'] += 1
+                return agent_data
+            except VersionConflictError as e:
+                print(f"[Storage] {e} (attempt {attempt + 1}/{settings.STORAGE_UPDATE_RETRIES})")
+                if agent_id not in self._agents:
+                    return None
+                # Jittered backoff so competing writers don't collide again
+                await asyncio.sleep(random.uniform(0, 0.002 * 2 ** attempt))
+        raise VersionConflictError(f"Agent {agent_id} kept changing during update")
+
+    async def load_agent(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """Load agent data from the registry"""
+        data = self._agents.get(agent_id)
+        if data is None:
+            return None
+        return self._copy(data)
 
     async def list_agents(self) -> List[Dict[str, Any]]:
-        """List all agents from YAML files"""
-        agents = []
-        for file_path in self.agents_dir.glob("agent-*.yml"):
-            agent_data = await self.load_agent(file_path.stem)
-            if agent_data:
-                agents.append(agent_data)
-        return agents
+        """List all agents in the registry"""
+        return [self._copy(data) for data in self._agents.values()]
+
+    async def project_agents(self, fields: List[str]) -> List[Dict[str, Any]]:
+        """Selected top-level fields of every agent, without copying histories"""
+        return [{field: data.get(field) for field in fields} for data in self._agents.values()]
+
+    async def count_agents(self) -> int:
+        """Number of agents in the registry"""
+        return len(self._agents)
 
     async def delete_agent(self, agent_id: str) -> bool:
-        """Delete agent YAML file"""
-        file_path = self.agents_dir / f"{agent_id}.yml"
-        if file_path.exists():
-            file_path.unlink()
-            return True
-        return False
+        """Delete agent from the registry and the backend"""
+        async with self._lock_for(agent_id):
+            if self._agents.pop(agent_id, None) is None:
+                return False
+            self.generation += 1
+            self._log_lines.pop(agent_id, None)
+            writes = self._writes()
+            writes.delete(agent_id)
+            commit = self._submit(writes)
+        if commit is not None:
+            await commit
+        return True
 
     async def agent_exists(self, agent_id: str) -> bool:
         """Check if agent exists"""
-        file_path = self.agents_dir / f"{agent_id}.yml"
-        return file_path.exists()
+        return agent_id in self._agents
 
     async def update_agent_action(self, agent_id: str, action: Dict[str, Any]) -> bool:
         """Add action to agent's history"""
-        agent_data = await self.load_agent(agent_id)
-        if not agent_data:
-            return False
+        from app.config import settings
 
-        if 'action_history' not in agent_data:
-            agent_data['action_history'] = []
+        async with self._lock_for(agent_id):
+            agent_data = self._agents.get(agent_id)
+            if agent_data is None:
+                return False
+            agent_data['version'] = agent_data.get('version', 0) + 1
+            self.generation += 1
 
-        # Add timestamp if not present
-        if 'timestamp' not in action:
-            action['timestamp'] = datetime.now()
+            action = dict(action)
+            # Add timestamp if not present
+            if 'timestamp' not in action:
+                action['timestamp'] = datetime.now()
 
-        # Convert enum to string value if needed
-        if 'type' in action and hasattr(action['type'], 'value'):
-            action['type'] = action['type'].value
+            # Tag the action with the turn it was recorded in
+            if action.get('turn') is None:
+                action['turn'] = self._current_turn.get() if self._open_batch() is not None else None
 
-        agent_data['action_history'].insert(0, action)
+            # Convert enum to string value if needed
+            if 'type' in action and hasattr(action['type'], 'value'):
+                action['type'] = action['type'].value
 
-        # Keep only last MAX_ACTION_HISTORY actions
-        from app.config import settings
-        if len(agent_data['action_history']) > settings.MAX_ACTION_HISTORY:
-            agent_data['action_history'] = agent_data['action_history'][:settings.MAX_ACTION_HISTORY]
+            history = agent_data.setdefault('action_history', [])
+            history.insert(0, action)
+
+            # Keep only last MAX_ACTION_HISTORY actions
+            del history[settings.MAX_ACTION_HISTORY:]
+
+            writes = self._writes()
+            self._append_action(writes, agent_id, action)
+            commit = self._submit(writes)
+        if commit is not None:
+            await commit
+        return True
+
+    @asynccontextmanager
+    async def batch(self, write_behind: bool = False, turn: Optional[int] = None):
+        """Collect every backend write made inside the block and commit them once at the end.
+
+        Mutations still apply to the registry immediately. The batch belongs to
+        the task that opened it and the tasks it starts; other callers keep
+        writing through. Batches nest; only the outermost one commits. With
+        `write_behind` the commit runs as a background task and the block exits
+        immediately. Actions recorded inside the block are tagged with `turn`.
+        """
+        outermost = self._open_batch() is None
+        if outermost:
+            batch_token = self._batch.set(WriteBatch())
+            turn_token = self._current_turn.set(turn)
+        try:
+            yield self
+        finally:
+            if outermost:
+                batch = self._batch.get().freeze(self._agents)
+                self._batch.reset(batch_token)
+                self._current_turn.reset(turn_token)
+                task = self._schedule_commit(batch)
+                if write_behind:
+                    # Nobody awaits a write-behind commit, so its failure can only be logged
+                    task.add_done_callback(self._log_failed_commit)
+                else:
+                    await task
+
+    def _schedule_commit(self, batch: WriteBatch) -> asyncio.Task:
+        """Queue a frozen batch behind the commits still in flight for the same agents"""
+        agent_ids = batch.agent_ids()
+        previous = {self._pending_commits[agent_id] for agent_id in agent_ids if agent_id in self._pending_commits}
+        task = asyncio.create_task(self._commit(batch, previous))
+        for agent_id in agent_ids:
+            self._pending_commits[agent_id] = task
+
+        def forget(done: asyncio.Task) -> None:
+            for agent_id in agent_ids:
+                if self._pending_commits.get(agent_id) is done:
+                    del self._pending_commits[agent_id]
+
+        task.add_done_callback(forget)
+        return task
+
+    async def flush(self) -> None:
+        """Wait for any background (write-behind) commits to finish"""
+        if self._pending_commits:
+            await asyncio.gather(*set(self._pending_commits.values()), return_exceptions=True)
+
+    async def _commit(self, batch: WriteBatch, previous: Set[asyncio.Task]) -> None:
+        if previous:
+            await asyncio.gather(*previous, return_exceptions=True)
+        if not len(batch):
+            return
+        await self.backend.commit(batch)
 
-        await self.save_agent(agent_id, agent_data)
-        return True
\ No newline at end of file
+    @staticmethod
+    def _log_failed_commit(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[Storage] Write-behind commit failed: {task.exception()}")
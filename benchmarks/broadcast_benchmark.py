@@ -0,0 +1,140 @@
+"""
+CPU time of one state broadcast against simulated websocket connections.
+
+    python benchmarks/broadcast_benchmark.py [--clients 100 1000 10000] [--characters 20] [--turns 5]
+
+Modes:
+  per_client_json  the old broadcast: json.dumps of the state for every connection
+  json             full state encoded once and shared by every connection
+  json_delta       ?protocol=delta: one delta frame per turn, encoded once
+  msgpack          "msgpack" subprotocol, full state (needs the msgpack package)
+  msgpack_delta    "msgpack" subprotocol with ?protocol=delta
+
+Connections are no-op sockets, so the figures are the server-side work of
+encoding and queueing a broadcast, including draining every client's writer
+task; network writes are not included. Bytes are per client per turn.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.action import GameAction
+from app.models.game import GameState, Character
+from app.routers.websocket import ConnectionManager, MSGPACK_SUBPROTOCOL, _msgpack
+from app.services.game_service import MaterializedState
+
+
+class FakeWebSocket:
+    """Accepts every frame instantly and counts the bytes"""
+
+    def __init__(self, binary: bool):
+        self.scope = {"subprotocols": [MSGPACK_SUBPROTOCOL] if binary else []}
+        self.bytes_sent = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        self.bytes_sent += len(text)
+
+    async def send_bytes(self, data):
+        self.bytes_sent += len(data)
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+    async def close(self, code=1000):
+        pass
+
+
+def make_snapshot(turn, characters):
+    state = GameState(
+        turn=turn,
+        characters={
+            f"agent-{i:08x}": Character(
+                name=f"Citizen{i}",
+                character_id=f"char-{i:04d}",
+                # A third of the characters act each turn
+                action=GameAction(type="say", content=f"Turn {turn}: has anyone seen the harbour master?")
+                if (i + turn) % 3 == 0 else None,
+            )
+            for i in range(characters)
+        },
+        map={"id": "map-plaza001", "description": "The bustling central plaza"},
+    )
+    return MaterializedState((turn, 0, 0), state, etag=f'"{turn}"')
+
+
+async def drain(manager):
+    while any(client.queue for client in manager.clients.values()):
+        await asyncio.sleep(0)
+
+
+async def run_mode(mode, clients, snapshots):
+    sockets = [FakeWebSocket(binary=mode.startswith("msgpack")) for _ in range(clients)]
+
+    if mode == "per_client_json":
+        start = time.process_time()
+        for snapshot in snapshots[1:]:
+            state = snapshot.state.model_dump()
+            for websocket in sockets:
+                await websocket.send_json(state)
+        elapsed = time.process_time() - start
+    else:
+        manager = ConnectionManager()
+        await manager.broadcast_state(snapshots[0])
+        for websocket in sockets:
+            await manager.connect(websocket, snapshots[0], delta=mode.endswith("delta"))
+        await drain(manager)
+        for websocket in sockets:
+            websocket.bytes_sent = 0
+
+        start = time.process_time()
+        for snapshot in snapshots[1:]:
+            await manager.broadcast_state(snapshot)
+            await drain(manager)
+        elapsed = time.process_time() - start
+
+        for websocket in sockets:
+            manager.disconnect(websocket)
+        await asyncio.sleep(0)
+
+    turns = len(snapshots) - 1
+    sent = sum(websocket.bytes_sent for websocket in sockets)
+    return elapsed / turns * 1000, sent / clients / turns
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--characters", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    modes = ["per_client_json", "json", "json_delta"]
+    if _msgpack is not None:
+        modes += ["msgpack", "msgpack_delta"]
+    else:
+        print("msgpack is not installed, skipping the binary subprotocol")
+
+    snapshots = [make_snapshot(turn, args.characters) for turn in range(args.turns + 1)]
+    print(f"{args.characters} characters, {args.turns} turns")
+    print(f"{'clients':>8} {'mode':>16} {'cpu ms/turn':>12} {'us/client':>10} {'bytes/client':>13}")
+    for clients in args.clients:
+        for mode in modes:
+            # The manager logs every broadcast; keep the table readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                cpu_ms, size = await run_mode(mode, clients, snapshots)
+            print(f"{clients:>8} {mode:>16} {cpu_ms:>12.1f} {cpu_ms * 1000 / clients:>10.1f} {size:>13.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
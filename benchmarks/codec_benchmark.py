@@ -0,0 +1,50 @@
+"""
+Encode/decode time per agent record for each storage codec.
+
+    python benchmarks/codec_benchmark.py [--iterations 2000]
+
+The record is a full agent with MAX_ACTION_HISTORY actions, serialized the
+way the storage layer stores it (ISO timestamps, plain enum values).
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.codecs import available_codecs
+from app.services.storage_backends import serialize_action, serialize_profile
+from storage_benchmark import make_agent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    agent = make_agent(1)
+    record = serialize_profile(agent)
+    record['action_history'] = [serialize_action(action) for action in agent['action_history']]
+
+    print(f"{'codec':>8} {'bytes':>7} {'encode µs':>10} {'decode µs':>10}")
+    for name, codec in available_codecs().items():
+        iterations = max(1, args.iterations // 20) if name == "yaml" else args.iterations
+        encoded = codec.dumps(record)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            codec.dumps(record)
+        encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            codec.loads(encoded)
+        decode_us = (time.perf_counter() - start) / iterations * 1e6
+
+        print(f"{name:>8} {len(encoded):>7} {encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
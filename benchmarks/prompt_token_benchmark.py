@@ -0,0 +1,137 @@
+"""
+Request payload and input tokens per agent decision for each prompt mode.
+
+    python benchmarks/prompt_token_benchmark.py [--agents 10] [--live]
+
+Modes:
+  inline        chat.complete with the instructions as system message and again in ACTION_PROMPT
+  remote_agent  agents.complete on the stored remote agent, sending only TURN_PROMPT
+  batch         one chat.complete deciding for every agent (LLM_BATCH_DECISIONS)
+
+Offline, tokens are counted with mistral_common's tokenizer when installed and
+estimated at 4 characters per token otherwise. Instructions held by a remote
+agent are not part of the request payload, but the provider prepends them and
+bills them as input, so they are included in remote_agent's tokens.
+With --live (needs MISTRAL_API_KEY) one real request per mode is made against
+a temporary remote agent and the provider's reported prompt_tokens are shown.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings
+from app.prompts.action_prompts import AGENT_PROMPT_VERSION
+
+PERSONALITY = ("A retired sea captain who tells long stories about storms and lost cargo. "
+               "Gruff but kind, distrusts merchants, and always asks newcomers where they are from.")
+
+
+def make_context(agents):
+    return {
+        'map_description': 'The bustling central plaza where citizens gather to discuss and debate',
+        'speakers': [{'name': agent['name'], 'message': 'Has anyone seen the harbour master today?'}
+                     for agent in agents[:5]],
+        'private_messages': [{'from': agents[-1]['name'], 'to': agents[0]['name'],
+                              'message': 'Meet me by the fountain later.'}],
+        'arrivals': [agents[-1]['name']],
+        'departures': [],
+    }
+
+
+def make_agents(count):
+    return [{
+        'id': f"agent-{i:08x}",
+        'name': f"Citizen{i}",
+        'mistral_id': f"ag_{i:08x}",
+        'model': settings.MISTRAL_MODEL,
+        'temperature': settings.MISTRAL_TEMPERATURE,
+        'instructions': PERSONALITY,
+        'remote_prompt_version': AGENT_PROMPT_VERSION,
+    } for i in range(count)]
+
+
+def token_counter():
+    try:
+        from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+        tokenizer = MistralTokenizer.v3().instruct_tokenizer.tokenizer
+        return "tokenizer", lambda text: len(tokenizer.encode(text, bos=False, eos=False))
+    except Exception:
+        return "estimate", lambda text: len(text) // 4
+
+
+def request_bodies(mistral, agents, context):
+    """The messages each mode sends for one turn of every agent"""
+    inline = [[
+        {"role": "system", "content": agent['instructions']},
+        {"role": "user", "content": mistral._build_action_prompt(agent, context)},
+    ] for agent in agents]
+    remote = [[
+        {"role": "user", "content": mistral._build_turn_prompt(agent, context)},
+    ] for agent in agents]
+    batch = [[
+        {"role": "system", "content": "You direct several characters in a shared scene and answer with JSON only."},
+        {"role": "user", "content": mistral._build_batch_prompt(agents, context)},
+    ]]
+    return {"inline": inline, "remote_agent": remote, "batch": batch}
+
+
+def stored_instructions(mistral, agents):
+    """Text the provider prepends to each mode's requests without it being sent"""
+    return {"remote_agent": [mistral._remote_instructions(agent['name'], agent['instructions']) for agent in agents]}
+
+
+async def run_live(mistral, agent, context):
+    """One real request per mode; returns provider-reported prompt tokens"""
+    remote = await mistral.create_agent("benchmark", agent['instructions'])
+    agent = dict(agent, mistral_id=remote['id'])
+    results = {}
+    try:
+        settings.LLM_USE_REMOTE_AGENTS = False
+        await mistral.generate_action(agent, context)
+        settings.LLM_USE_REMOTE_AGENTS = True
+        await mistral.generate_action(agent, context)
+        for mode, stats in mistral.token_metrics().items():
+            results[mode] = stats['prompt_tokens_per_agent']
+    finally:
+        await mistral.delete_agent(remote['id'])
+        await mistral.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--live", action="store_true", help="also measure with real requests")
+    args = parser.parse_args()
+
+    if not args.live:
+        settings.MISTRAL_API_KEY = settings.MISTRAL_API_KEY or "offline"
+    from app.services.mistral_service import MistralService
+    mistral = MistralService()
+
+    agents = make_agents(args.agents)
+    context = make_context(agents)
+    method, count_tokens = token_counter()
+
+    print(f"{args.agents} agents, tokens by {method}")
+    print(f"{'mode':>13} {'requests':>9} {'bytes/agent':>12} {'tokens/agent':>13}")
+    stored = stored_instructions(mistral, agents)
+    for mode, requests in request_bodies(mistral, agents, context).items():
+        payload = sum(len(json.dumps({"messages": messages}).encode()) for messages in requests)
+        tokens = sum(count_tokens(message['content']) for messages in requests for message in messages)
+        tokens += sum(count_tokens(text) for text in stored.get(mode, []))
+        print(f"{mode:>13} {len(requests):>9} {payload / args.agents:>12.0f} {tokens / args.agents:>13.1f}")
+
+    if args.live:
+        print("\nProvider-reported prompt tokens per agent:")
+        for mode, tokens in asyncio.run(run_live(mistral, agents[0], context)).items():
+            print(f"{mode:>13} {tokens:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Compare list/get/update latency of the file (YAML, JSON, msgpack) and SQLite storage backends.
+
+    python benchmarks/storage_benchmark.py [--sizes 20 200 2000] [--kinds yaml sqlite]
+
+Each backend is seeded with N agents carrying a full action history, then:
+- list:   cold load of every agent (what StorageService does at startup)
+- get:    load of a single agent straight from storage
+- update: one committed write of a profile change plus one appended action
+"""
+
+import argparse
+import asyncio
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings
+from app.services.codecs import available_codecs
+from app.services.storage_backends import WriteBatch, create_backend
+
+
+def make_agent(index: int) -> dict:
+    agent_id = f"agent-{index:08x}"
+    return {
+        'id': agent_id,
+        'name': f"Agent {index}",
+        'mistral_id': f"ag_{index:032x}",
+        'model': settings.MISTRAL_MODEL,
+        'instructions': "A curious philosopher who loves asking questions about everything. " * 3,
+        'character_id': agent_id,
+        'visible': True,
+        'temperature': 0.7,
+        'created_at': datetime.now(),
+        'pending_deletion': False,
+        'pending_entry': False,
+        'action_history': [
+            {
+                'type': 'say',
+                'target': None,
+                'content': f"Message number {turn} from agent {index}, about the weather and the agora.",
+                'timestamp': datetime.now(),
+                'turn': turn,
+            }
+            for turn in range(settings.MAX_ACTION_HISTORY, 0, -1)
+        ],
+    }
+
+
+def timed(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_backend(kind: str, size: int, workdir: Path) -> dict:
+    agents_dir = workdir / kind
+    agents_dir.mkdir()
+    if kind == "sqlite":
+        backend = create_backend("sqlite", agents_dir, agents_dir / "agora.db")
+    else:
+        backend = create_backend("file", agents_dir, file_format=kind)
+
+    agents = {agent['id']: agent for agent in (make_agent(i) for i in range(size))}
+    seed = WriteBatch()
+    for agent_id in agents:
+        seed.save_profile(agent_id)
+        seed.replace_history(agent_id)
+    asyncio.run(backend.commit(seed.freeze(agents)))
+
+    ids = list(agents)
+    loop = asyncio.new_event_loop()
+
+    def update():
+        agent_id = random.choice(ids)
+        agents[agent_id]['visible'] = not agents[agent_id]['visible']
+        batch = WriteBatch()
+        batch.save_profile(agent_id)
+        batch.append(agent_id, {'type': 'say', 'content': "benchmark", 'timestamp': datetime.now(), 'turn': 0})
+        loop.run_until_complete(backend.commit(batch.freeze(agents)))
+
+    result = {
+        'list': timed(backend.load_all, repeat=3),
+        'get': timed(lambda: backend.load_agent(random.choice(ids)), repeat=50),
+        'update': timed(update, repeat=50),
+    }
+    loop.close()
+    backend.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--kinds", nargs="+", default=list(available_codecs()) + ["sqlite"])
+    args = parser.parse_args()
+
+    print(f"{'agents':>7} {'backend':>8} {'list ms':>10} {'get ms':>8} {'update ms':>10}")
+    for size in args.sizes:
+        workdir = Path(tempfile.mkdtemp(prefix="agora-bench-"))
+        try:
+            for kind in args.kinds:
+                r = bench_backend(kind, size, workdir)
+                print(f"{size:>7} {kind:>8} {r['list']:>10.2f} {r['get']:>8.3f} {r['update']:>10.3f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
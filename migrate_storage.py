@@ -0,0 +1,60 @@
+"""
+Copy every agent from one storage backend or file format to another.
+
+    python migrate_storage.py                       # agents/*.yml -> SQLite at settings.SQLITE_PATH
+    python migrate_storage.py --to yaml --from sqlite
+    python migrate_storage.py --from yaml --to msgpack   # convert the agents directory in place
+"""
+
+import argparse
+from pathlib import Path
+
+from app.config import settings
+from app.services.storage_backends import FileBackend, WriteBatch, create_backend
+
+FILE_FORMATS = ["yaml", "json", "msgpack"]
+
+
+def open_backend(kind: str, agents_dir: Path, sqlite_path: Path):
+    if kind in FILE_FORMATS:
+        return create_backend("file", agents_dir, sqlite_path, file_format=kind)
+    return create_backend(kind, agents_dir, sqlite_path)
+
+
+def migrate(source_kind: str, target_kind: str, agents_dir: Path, sqlite_path: Path) -> int:
+    """Copy all agents (profile and stored action history) from source to target"""
+    import asyncio
+
+    if source_kind in FILE_FORMATS and target_kind in FILE_FORMATS:
+        # The file backend reads every format and rewrites what it loads in its own
+        return len(FileBackend(agents_dir, target_kind).load_all())
+
+    source = open_backend(source_kind, agents_dir, sqlite_path)
+    target = open_backend(target_kind, agents_dir, sqlite_path)
+
+    agents = source.load_all()
+    batch = WriteBatch()
+    for agent_id in agents:
+        batch.save_profile(agent_id)
+        batch.replace_history(agent_id)
+
+    asyncio.run(target.commit(batch.freeze(agents)))
+    source.close()
+    target.close()
+    return len(agents)
+
+
+if __name__ == "__main__":
+    choices = FILE_FORMATS + ["sqlite"]
+    parser = argparse.ArgumentParser(description="Migrate Agora agents between storage backends and formats")
+    parser.add_argument("--from", dest="source", default="yaml", choices=choices)
+    parser.add_argument("--to", dest="target", default="sqlite", choices=choices)
+    parser.add_argument("--agents-dir", type=Path, default=settings.AGENTS_DIR)
+    parser.add_argument("--sqlite-path", type=Path, default=settings.SQLITE_PATH)
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        parser.error("--from and --to must differ")
+
+    count = migrate(args.source, args.target, args.agents_dir, args.sqlite_path)
+    print(f"✓ Migrated {count} agents from {args.source} to {args.target}")
@@ -41,6 +41,7 @@ class HabboGame {
         this.useCustomCharacter = false;
 
         this.speechBubbles = []; // Array to store multiple speech bubbles
+        this.streamingBubbles = {}; // NPC id -> bubble still receiving streamed speech
         this.maxBubbles = 5; // Maximum number of bubbles to display
         this.bubbleDuration = 5000; // 5 seconds per bubble
 
@@ -192,7 +193,17 @@ class HabboGame {
 
     connectWebSocket() {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws/state`;
+        // After a reconnect, ask for the versions missed since the last one received
+        const since = this.stateVersion != null && this.stateEpoch
+            ? `&since=${this.stateVersion}&epoch=${encodeURIComponent(this.stateEpoch)}` : '';
+        const wsUrl = `${protocol}//${window.location.host}/ws/state?protocol=delta${since}`;
+
+        // Versioned state kept in sync from snapshot and delta frames
+        this.serverState = null;
+        this.stateVersion = null;
+        this.resyncRequested = false;
+        // States are shown one after another, so replayed turns play out in order
+        this.stateChain = this.stateChain || Promise.resolve();
 
         this.ws = new WebSocket(wsUrl);
 
@@ -210,16 +221,39 @@ class HabboGame {
                     return;
                 }
 
-                // Update turn number if displayed
-                const turnElement = document.getElementById('turnNumber');
-                if (turnElement && data.turn !== undefined) {
-                    turnElement.textContent = `Turn: ${data.turn}`;
+                // Partial speech streamed while the agent is still deciding
+                if (data.type === 'speech') {
+                    this.updateStreamingSpeech(data.agent_id, data.content);
+                    return;
+                }
+
+                if (data.type === 'snapshot') {
+                    this.serverState = data.state;
+                    this.stateVersion = data.version;
+                    this.stateEpoch = data.epoch;
+                    this.resyncRequested = false;
+                    await this.queueServerState(this.serverState);
+                    return;
                 }
 
-                if (data.characters) {
-                    console.log(`Received state update for turn ${data.turn}`);
-                    await this.processStateUpdate(data.characters);
+                if (data.type === 'delta') {
+                    if (this.stateVersion === null || data.base !== this.stateVersion) {
+                        // Missed a version: ignore deltas until a fresh snapshot arrives
+                        if (!this.resyncRequested) {
+                            console.log(`State version gap (have ${this.stateVersion}, delta from ${data.base}), resyncing`);
+                            this.resyncRequested = true;
+                            this.ws.send(JSON.stringify({ type: 'resync' }));
+                        }
+                        return;
+                    }
+                    this.applyStateDelta(this.serverState, data);
+                    this.stateVersion = data.version;
+                    await this.queueServerState(this.serverState);
+                    return;
                 }
+
+                // Full state (server without delta support)
+                await this.queueServerState(data);
             } catch (error) {
                 console.error('Failed to process WebSocket message:', error);
             }
@@ -236,6 +270,47 @@ class HabboGame {
         };
     }
 
+    applyStateDelta(state, delta) {
+        // Mirror of diff_states in app/services/state_delta.py
+        for (const charId of delta.removed || []) {
+            delete state.characters[charId];
+        }
+        for (const [charId, charData] of Object.entries(delta.added || {})) {
+            state.characters[charId] = charData;
+        }
+        for (const [charId, action] of Object.entries(delta.actions || {})) {
+            if (state.characters[charId]) {
+                state.characters[charId].action = action;
+            }
+        }
+        if (delta.map !== undefined) {
+            state.map = delta.map;
+        }
+        state.turn = delta.turn;
+    }
+
+    queueServerState(state) {
+        // Later deltas mutate serverState, so show a copy of this version
+        const copy = structuredClone(state);
+        this.stateChain = this.stateChain
+            .then(() => this.applyServerState(copy))
+            .catch(error => console.error('Failed to apply state:', error));
+        return this.stateChain;
+    }
+
+    async applyServerState(state) {
+        // Update turn number if displayed
+        const turnElement = document.getElementById('turnNumber');
+        if (turnElement && state.turn !== undefined) {
+            turnElement.textContent = `Turn: ${state.turn}`;
+        }
+
+        if (state.characters) {
+            console.log(`Received state update for turn ${state.turn}`);
+            await this.processStateUpdate(state.characters);
+        }
+    }
+
     async fetchAndProcessState() {
         // Fallback for manual fetch if needed
         try {
@@ -267,6 +342,12 @@ class HabboGame {
                 this.createNPC(charId, charData.name, charData.character_id);
             }
 
+            // Drop streamed speech the final action didn't keep
+            if (this.streamingBubbles[charId] && !(charData.action && charData.action.content)) {
+                this.removeNPCSpeechBubble(charId, this.streamingBubbles[charId]);
+                delete this.streamingBubbles[charId];
+            }
+
             // Get the action (if any)
             if (charData.action) {
                 actionsToExecute.push({
@@ -608,6 +689,16 @@ class HabboGame {
         const npc = this.npcs[charId];
         if (!npc) return;
 
+        // The final action replaces the text that was streamed for it
+        const streamed = this.streamingBubbles[charId];
+        delete this.streamingBubbles[charId];
+        if (streamed && npc.speechBubbles.includes(streamed)) {
+            streamed.text = text;
+            streamed.timestamp = Date.now();
+            this.render();
+            return streamed;
+        }
+
         const bubble = {
             text: text,
             timestamp: Date.now(),
@@ -620,15 +711,47 @@ class HabboGame {
             npc.speechBubbles = npc.speechBubbles.slice(0, this.maxBubbles);
         }
 
-        setTimeout(() => {
-            const index = npc.speechBubbles.indexOf(bubble);
-            if (index > -1) {
-                npc.speechBubbles.splice(index, 1);
-                this.render();
+        // Expire the bubble bubbleDuration after its last update
+        const expire = () => {
+            const remaining = bubble.timestamp + this.bubbleDuration - Date.now();
+            if (remaining > 0) {
+                setTimeout(expire, remaining);
+                return;
             }
-        }, this.bubbleDuration);
+            this.removeNPCSpeechBubble(charId, bubble);
+        };
+        setTimeout(expire, this.bubbleDuration);
 
         this.render();
+        return bubble;
+    }
+
+    removeNPCSpeechBubble(charId, bubble) {
+        const npc = this.npcs[charId];
+        if (!npc) return;
+
+        const index = npc.speechBubbles.indexOf(bubble);
+        if (index > -1) {
+            npc.speechBubbles.splice(index, 1);
+            this.render();
+        }
+    }
+
+    updateStreamingSpeech(charId, text) {
+        const npc = this.npcs[charId];
+        if (!npc || !text) return;
+
+        const bubble = this.streamingBubbles[charId];
+        if (bubble && npc.speechBubbles.includes(bubble)) {
+            bubble.text = text;
+            bubble.timestamp = Date.now();
+            this.render();
+            return;
+        }
+
+        // The previous streamed bubble already expired: start a new one
+        delete this.streamingBubbles[charId];
+        this.streamingBubbles[charId] = this.addNPCSpeechBubble(charId, text);
     }
 
     async loadCharacterList() {